@@ -1,54 +1,105 @@
-import subprocess
+import argparse
 import sys
+import os
+import time
 
-# Check for pyperclip and ask the user if they want to install it
-try:
-    import pyperclip
-    clipboard_available = True
-except ImportError:
-    clipboard_available = False
-    print("\nClipboard support (via pyperclip) is not available.")
-    choice = input("Do you want to install pyperclip for automatic copying? (Y/N): ").strip().lower()
-    if choice == "y":
-        try:
-            subprocess.check_call([sys.executable, "-m", "pip", "install", "pyperclip"])
-            import pyperclip
-            clipboard_available = True
-            print("\npyperclip installed successfully.\n")
-        except Exception as e:
-            print(f"Installation failed: {e}")
-            clipboard_available = False
-    else:
-        print("Continuing without clipboard support.\n")
+from ghostwriter_batch import WATCH_SETTLE, FolderWatcher, move_to_folder, process_file
+from ghostwriter_core import (
+    FSYNC_MODES,
+    NORMALIZE_STEPS,
+    AtomicFile,
+    Normalizer,
+    compare_statistics,
+    decode_file_mmap,
+    decode_text,
+    encode_text,
+    iter_chunks,
+    iter_decoded,
+    iter_encoded,
+    scan_tree,
+    sync_outputs,
+)
 
-from random import randint
-from colorama import init, Fore, Style
-import time
-import os
+# Colors stay empty until init_colors() loads colorama, which only happens
+# when something is actually printed to a terminal
+bright = dim = red = green = cyan = yellow = blue = white = magenta = ""
+colors_ready = False
+
+
+def init_colors():
+    global bright, dim, red, green, cyan, yellow, blue, white, magenta, colors_ready
+    if colors_ready:
+        return
+    colors_ready = True
+    try:
+        from colorama import init, Fore, Style
+    except ImportError:
+        return
+
+    init(convert=True)
+    init(autoreset=True)
+
+    bright = Style.BRIGHT
+    dim = Style.DIM
+    red = Fore.RED + bright + dim
+    green = Fore.GREEN + bright + dim
+    cyan = Fore.CYAN + bright + dim
+    yellow = Fore.LIGHTYELLOW_EX + bright + dim
+    blue = Fore.BLUE + bright + dim
+    white = Fore.WHITE + bright + dim
+    magenta = Fore.MAGENTA + bright + dim
 
-init(convert=True)
-init(autoreset=True)
 
-bright = Style.BRIGHT
-dim = Style.DIM
-red = Fore.RED + bright + dim
-green = Fore.GREEN + bright + dim
-cyan = Fore.CYAN + bright + dim
-yellow = Fore.LIGHTYELLOW_EX + bright + dim
-blue = Fore.BLUE + bright + dim
-white = Fore.WHITE + bright + dim
-magenta = Fore.MAGENTA + bright + dim
+REPORT_FIELDS = ["path", "size", "chars", "invisible", "density", "flagged", "error"]
 
 FILE_IN = "aap_in.txt"
 FILE_OUT = "aap_out.txt"
 SINGLE_CHAR = False  # Enable if you have a word limit and don't want aap to use many chars
 
+pyperclip = None
+clipboard_available = False
+
+
+def setup_clipboard(offer_install=True):
+    # Check for pyperclip and ask the user if they want to install it
+    global pyperclip, clipboard_available
+    try:
+        import pyperclip
+        clipboard_available = True
+    except ImportError:
+        clipboard_available = False
+        if not offer_install:
+            return
+        print("\nClipboard support (via pyperclip) is not available.")
+        choice = input("Do you want to install pyperclip for automatic copying? (Y/N): ").strip().lower()
+        if choice == "y":
+            try:
+                import subprocess
+                subprocess.check_call([sys.executable, "-m", "pip", "install", "pyperclip"])
+                import pyperclip
+                clipboard_available = True
+                print("\npyperclip installed successfully.\n")
+            except Exception as e:
+                print(f"Installation failed: {e}")
+                clipboard_available = False
+        else:
+            print("Continuing without clipboard support.\n")
+
+
+def copy_to_clipboard(text, out=sys.stdout):
+    if clipboard_available:
+        try:
+            pyperclip.copy(text)
+            print(blue + "\n(The result has been copied to the clipboard)", file=out)
+        except Exception as e:
+            print(red + "\nFailed to copy to clipboard:", e, file=out)
+
+
 def cls():
     os.system('cls' if os.name == 'nt' else 'clear')
 
-def main():
-    cls()
-    mod_str = ""
+
+def run_interactive_once():
     input_text = input("\n\n > Introduce a text or press enter: ")
 
     if input_text == "":
@@ -56,7 +107,7 @@ def main():
             print(red + "{} could not be found, creating\n".format(FILE_IN))
             open(FILE_IN, "w+", encoding="utf-8").close()
             input()
-            main()
+            return
 
         input_file = open(FILE_IN, "r", encoding="utf-8")
         input_text = input_file.read()
@@ -65,19 +116,9 @@ def main():
         if input_text == "":
             print(red + "{} file cannot be empty\n".format(FILE_IN))
             input()
-            main()
+            return
 
-    mod_words = []
-
-    for word in input_text.split():
-        if SINGLE_CHAR:
-            middle = int(len(word) / 2)
-            mod_word = word[:middle] + "‎" + word[middle:]
-        else:
-            mod_word = "".join(char + "‎" for char in word)
-        mod_words.append(mod_word)
-
-    mod_str = " ".join(mod_words)
+    mod_str = encode_text(input_text, SINGLE_CHAR)
 
     f = open(FILE_OUT, "w", encoding="utf-8")
     f.write(mod_str)
@@ -85,14 +126,362 @@ def main():
     print(green + "\nResult saved into: {}".format(FILE_OUT))
     print(cyan + "\n{}".format(mod_str))
 
-    if clipboard_available:
+    copy_to_clipboard(mod_str)
+
+    input()
+
+
+def interactive():
+    init_colors()
+    setup_clipboard()
+    # Loop instead of recursing so long sessions never hit the recursion limit
+    while True:
+        cls()
+        try:
+            run_interactive_once()
+        except (KeyboardInterrupt, EOFError):
+            print()
+            return
+
+
+def open_input(path):
+    if path == "-":
+        return sys.stdin
+    # Line endings stay as they are, as in the memory-mapped decode
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def output_path_for(args, path):
+    if args.output_dir:
+        name = "stdin.txt" if path == "-" else os.path.basename(path)
+        return os.path.join(args.output_dir, name)
+    return args.output
+
+
+def transform(args, text):
+    if args.normalizer:
+        return args.normalizer(text)
+    if args.decode:
+        return decode_text(text)
+    return encode_text(text, args.single_char)
+
+
+def mappable(path):
+    """Whether path can be memory-mapped: a regular file that is not empty, unlike a pipe such as <(cat file)"""
+    import stat
+
+    info = os.stat(path)
+    return stat.S_ISREG(info.st_mode) and info.st_size > 0
+
+
+def process(args, path):
+    out_path = output_path_for(args, path)
+    to_stdout = out_path in (None, "-")
+    if args.decode and not args.normalizer and not args.copy and path != "-" and not to_stdout and mappable(path):
+        # File to file decodes work on the memory-mapped bytes directly
+        decode_file_mmap(path, out_path, fsync=args.fsync == "file")
+        print(green + "Result saved into: {}".format(out_path), file=sys.stderr)
+        return out_path
+
+    src = open_input(path)
+    try:
+        if args.copy:
+            # The clipboard needs the whole result anyway
+            mod_str = transform(args, src.read())
+            chunks = [mod_str]
+        elif args.normalizer:
+            chunks = args.normalizer.stream(iter_chunks(src))
+        elif args.decode:
+            # Otherwise stream, so input size never matters
+            chunks = iter_decoded(iter_chunks(src))
+        else:
+            chunks = iter_encoded(iter_chunks(src), args.single_char)
+        if to_stdout:
+            sys.stdout.writelines(chunks)
+            # Decoding and normalizing give back the text as it was, so a
+            # pipe of them changes nothing but the invisible characters
+            if not args.decode:
+                sys.stdout.write("\n")
+            sys.stdout.flush()
+        else:
+            # Written next to the target and renamed over it when complete, so
+            # a failed run never leaves a partial file (and -o may name the input)
+            with AtomicFile(out_path, "w", "utf-8", fsync=args.fsync == "file", newline="") as dst:
+                dst.writelines(chunks)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+
+    if not to_stdout:
+        print(green + "Result saved into: {}".format(out_path), file=sys.stderr)
+    if args.copy:
+        copy_to_clipboard(mod_str, out=sys.stderr)
+    return None if to_stdout else out_path
+
+
+def use_utf8_stdio():
+    """Read and write pipes as UTF-8 like files, whatever the locale encoding"""
+    for stream in (sys.stdin, sys.stdout):
+        # Not there when a caller swapped in a plain stream
+        if hasattr(stream, "reconfigure"):
+            stream.reconfigure(encoding="utf-8")
+
+
+def headless(args):
+    if sys.stderr.isatty():
+        init_colors()
+    use_utf8_stdio()
+    if args.copy:
+        setup_clipboard(offer_install=False)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    status = 0
+    written = []
+    for path in args.inputs:
+        try:
+            out_path = process(args, path)
+        except (OSError, UnicodeDecodeError) as e:
+            print(red + "{}: {}".format(path, e), file=sys.stderr)
+            status = 1
+        else:
+            if out_path:
+                written.append(out_path)
+    if args.fsync == "batch" and written:
+        try:
+            sync_outputs(written)
+        except OSError as e:
+            print(red + "Could not flush the outputs to disk: {}".format(e), file=sys.stderr)
+            status = 1
+    return status
+
+
+def write_report(rows, path):
+    if path is None or path == "-":
+        use_utf8_stdio()
+        out = sys.stdout
+    else:
+        out = open(path, "w", encoding="utf-8", newline="")
+    try:
+        if path and path.lower().endswith(".json"):
+            import json
+            json.dump([{field: row[field] for field in REPORT_FIELDS} for row in rows], out, indent=1)
+            out.write("\n")
+        else:
+            import csv
+            writer = csv.DictWriter(out, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def split_patterns(text):
+    return tuple(pattern.strip() for pattern in text.split(",") if pattern.strip())
+
+
+def scan(args):
+    if sys.stderr.isatty():
+        init_colors()
+    rows = []
+    for row in scan_tree(args.inputs, workers=args.workers, include=split_patterns(args.include),
+                         exclude=split_patterns(args.exclude), max_size=args.max_size):
+        row["density"] = round(row["density"], 6)
+        row["flagged"] = not row["error"] and row["density"] >= args.threshold
+        rows.append(row)
+        if len(rows) % 10000 == 0:
+            print("{} files scanned...".format(len(rows)), file=sys.stderr)
+
+    rows.sort(key=lambda row: row[args.sort], reverse=args.sort != "path")
+    write_report(rows, args.report)
+
+    flagged = sum(row["flagged"] for row in rows)
+    errors = sum(bool(row["error"]) for row in rows)
+    color = red if flagged else green
+    print(color + "{} files scanned, {} above {:.2%} invisible characters, {} unreadable".format(
+        len(rows), flagged, args.threshold, errors), file=sys.stderr)
+    return 0
+
+
+def ignore_interrupts():
+    # Pool workers leave Ctrl+C to the main process, which lets running jobs finish
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def report_watched(args, path, result):
+    name = os.path.basename(path)
+    if result["input_stats"] is None:
+        print(green + "{}: decoded as bytes, no statistics".format(name), file=sys.stderr)
+        return
+    if args.decode:
+        stats = compare_statistics(result["output_stats"], result["input_stats"])
+    else:
+        stats = compare_statistics(result["input_stats"], result["output_stats"])
+    print(green + "{}: {} -> {} chars, {} invisible characters {}".format(
+        name, result["input_stats"].length, result["output_stats"].length,
+        abs(stats["Characters Inserted"]), "removed" if args.decode else "inserted"), file=sys.stderr)
+
+
+def watch(args):
+    """Process files dropped into the inbox until interrupted, moving each to done/ or failed/"""
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    if sys.stderr.isatty():
+        init_colors()
+    inbox = args.watch
+    output_dir = args.output_dir or os.path.join(inbox, "output")
+    done_dir = args.done or os.path.join(inbox, "done")
+    failed_dir = args.failed or os.path.join(inbox, "failed")
+    os.makedirs(output_dir, exist_ok=True)
+    operation = "decode" if args.decode else "encode"
+    watcher = FolderWatcher(inbox, split_patterns(args.include), split_patterns(args.exclude), args.settle)
+    print("Watching {} (Ctrl+C to stop)".format(inbox), file=sys.stderr)
+
+    counts = {"done": 0, "failed": 0}
+    pending = {}
+
+    def finish(future):
+        path, signature = pending.pop(future)
         try:
-            pyperclip.copy(mod_str)
-            print(blue + "\n(The result has been copied to the clipboard)")
+            result = future.result()
         except Exception as e:
-            print(red + "\nFailed to copy to clipboard:", e)
+            print(red + "{}: {}".format(os.path.basename(path), e), file=sys.stderr)
+            target, kind = failed_dir, "failed"
+        else:
+            report_watched(args, path, result)
+            target, kind = done_dir, "done"
+        # A file rewritten meanwhile stays in the inbox and is picked up again
+        if watcher.signature(path) not in (signature, None):
+            return
+        try:
+            move_to_folder(path, target)
+            counts[kind] += 1
+        except OSError as e:
+            print(red + "{}: could not move to {}: {}".format(os.path.basename(path), target, e), file=sys.stderr)
+
+    with ProcessPoolExecutor(args.workers, initializer=ignore_interrupts) as pool:
+        try:
+            while True:
+                for path in watcher.poll():
+                    # There is no end of the batch to wait for, so any --fsync flushes every file
+                    future = pool.submit(process_file, operation, path, output_dir, args.single_char,
+                                         fsync=args.fsync != "none")
+                    pending[future] = (path, watcher.signature(path))
+                # Waiting on the jobs doubles as the pause between polls, so
+                # both new files and finished jobs are noticed within an interval
+                if pending:
+                    done, _ = wait(pending, timeout=args.interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finish(future)
+                else:
+                    time.sleep(args.interval)
+        except KeyboardInterrupt:
+            print("\nStopping after the files in progress...", file=sys.stderr)
+            pool.shutdown(cancel_futures=True)
+            for future in list(pending):
+                if future.cancelled():
+                    del pending[future]
+                else:
+                    wait([future])
+                    finish(future)
+    print("{} files done, {} failed".format(counts["done"], counts["failed"]), file=sys.stderr)
+    return 1 if counts["failed"] else 0
+
+
+def normalize_steps(text):
+    """Parse --normalize: comma-separated steps run after decoding, or 'all'"""
+    if text == "all":
+        return NORMALIZE_STEPS[1:]
+    steps = tuple(step.strip() for step in text.split(",") if step.strip())
+    unknown = [step for step in steps if step not in NORMALIZE_STEPS[1:]]
+    if unknown:
+        raise argparse.ArgumentTypeError("unknown step(s) {}, choose from {}".format(
+            ", ".join(unknown), ", ".join(NORMALIZE_STEPS[1:])))
+    return steps
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Insert (or with --decode, remove) invisible characters in text. Runs interactively when "
+                    "no inputs are given and stdin is a terminal.")
+    parser.add_argument("inputs", nargs="*",
+                        help="files to process, '-' for stdin (default: stdin when it is piped)")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("-o", "--output", help="write the result to this file instead of stdout")
+    target.add_argument("-d", "--output-dir", help="write one result per input into this directory")
+    parser.add_argument("-D", "--decode", action="store_true",
+                        help="remove invisible characters instead of inserting them")
+    parser.add_argument("-s", "--single-char", action="store_true", default=SINGLE_CHAR,
+                        help="insert a single character per word")
+    parser.add_argument("-c", "--copy", action="store_true",
+                        help="also copy each result to the clipboard (needs pyperclip)")
+    parser.add_argument("--normalize", type=normalize_steps, metavar="STEPS",
+                        help="with --decode, also clean the text in the same pass: comma-separated steps "
+                             "out of {} or 'all'".format(", ".join(NORMALIZE_STEPS[1:])))
+    parser.add_argument("--fsync", choices=FSYNC_MODES, default="none",
+                        help="flush output files to disk after each file, or once after all of them "
+                             "(default: none)")
+
+    scanning = parser.add_argument_group("scan mode")
+    scanning.add_argument("--scan", action="store_true",
+                          help="report invisible characters in the input files and directory trees "
+                               "instead of encoding")
+    scanning.add_argument("--report", help="write the report here (.json for JSON, CSV otherwise; "
+                                           "default: CSV on stdout)")
+    scanning.add_argument("--threshold", type=float, default=0.01,
+                          help="flag files whose share of invisible characters is at least this "
+                               "(default: 0.01)")
+    scanning.add_argument("--sort", choices=REPORT_FIELDS[:5], default="density",
+                          help="report order, largest first except for path (default: density)")
+    scanning.add_argument("--include", default="*.txt",
+                          help="comma-separated glob patterns of files scanned in directories, empty "
+                               "for all (default: *.txt)")
+    scanning.add_argument("--exclude", default="",
+                          help="comma-separated glob patterns of files and directories to skip")
+    scanning.add_argument("--max-size", type=int, help="skip files larger than this many bytes")
+    scanning.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+
+    watching = parser.add_argument_group("watch mode", "--include, --exclude and --workers apply as well")
+    watching.add_argument("--watch", metavar="INBOX",
+                          help="keep processing the files that appear in this folder until interrupted, writing "
+                               "the results to --output-dir (default: INBOX/output)")
+    watching.add_argument("--done", help="where processed files are moved (default: INBOX/done)")
+    watching.add_argument("--failed", help="where files that could not be processed are moved "
+                                           "(default: INBOX/failed)")
+    watching.add_argument("--settle", type=float, default=WATCH_SETTLE,
+                          help="seconds a file must go unmodified before it is processed "
+                               "(default: %(default)s)")
+    watching.add_argument("--interval", type=float, default=0.1,
+                          help="seconds between polls of the inbox (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    if args.watch and (args.inputs or args.scan or args.output):
+        parser.error("--watch takes no inputs and cannot be combined with --scan or --output")
+    if args.scan and not args.inputs:
+        parser.error("--scan needs at least one file or directory")
+    if len(args.inputs) > 1 and args.output:
+        parser.error("--output takes a single input; use --output-dir for several")
+    if args.normalize and (not args.decode or args.scan or args.watch):
+        parser.error("--normalize needs --decode and cannot be combined with --scan or --watch")
+    args.normalizer = Normalizer.from_steps(("strip",) + args.normalize) if args.normalize else None
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.scan:
+        return scan(args)
+    if args.watch:
+        return watch(args)
+    if not args.inputs:
+        if sys.stdin.isatty():
+            interactive()
+            return 0
+        args.inputs = ["-"]
+    return headless(args)
 
-    input()
-    main()
 
-main()
+if __name__ == '__main__':
+    sys.exit(main())
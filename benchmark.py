@@ -0,0 +1,311 @@
+"""Benchmarks for the GhostWriter text transforms.
+
+Usage:
+    python benchmark.py suite [--sizes 1K,64K,1M,16M] [--save FILE] [--compare FILE]
+    python benchmark.py decode [--size-mb 100] [--repeat 3]
+    python benchmark.py startup [--repeat 20]
+    python benchmark.py normalize [--size-mb 16] [--repeat 3] [--chunk-kb 64]
+
+The suite runs offline on generated corpora. For every hot path and size it
+reports throughput and peak traced memory, and can store the numbers as a baseline to compare
+later runs against.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+import unicodedata
+
+from ghostwriter_core import (
+    ZERO_WIDTH_CHAR,
+    Normalizer,
+    calc_entropy,
+    decode_text,
+    encode_text,
+    get_text_statistics,
+    invisible_chars,
+)
+
+SAMPLE = "The quick brown fox jumps over the lazy dog. "
+# Words in several scripts, mixed into the suite's corpora
+WORDS = {
+    "latin": ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit"],
+    "accented": ["café", "naïve", "über", "señor", "façade", "déjà", "smørrebrød"],
+    "cyrillic": ["привет", "мир", "текст", "пример", "данные"],
+    "cjk": ["漢字", "日本語", "中文", "テキスト", "한국어"],
+    "emoji": ["🙂", "🚀", "📄", "🕵️‍♂️"],
+}
+# Separators between words, weighted towards ordinary single spaces
+SEPARATORS = [" "] * 12 + ["  ", "\t", "\n", "\n\n", " \n", "\r\n", "   "]
+SIZE_UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def make_text(size, sample=SAMPLE):
+    return (sample * (size // len(sample) + 1))[:size]
+
+
+def parse_size(text):
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in SIZE_UNITS:
+        return int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+    return int(text)
+
+
+def format_size(size):
+    for unit in ("G", "M", "K"):
+        if size >= SIZE_UNITS[unit] and size % SIZE_UNITS[unit] == 0:
+            return f"{size // SIZE_UNITS[unit]}{unit}"
+    return str(size)
+
+
+def make_corpus(size, seed=0):
+    """Deterministic mixed-script text of about `size` UTF-8 bytes"""
+    rng = random.Random(seed)
+    scripts = list(WORDS)
+    parts = []
+    block_bytes = 0
+    # Build one 64 KB block and repeat it, so even 1 GB corpora are quick to generate
+    while block_bytes < min(size, 1 << 16):
+        part = rng.choice(WORDS[rng.choice(scripts)]) + rng.choice(SEPARATORS)
+        parts.append(part)
+        block_bytes += len(part.encode("utf-8"))
+    block = "".join(parts)
+    return (block * (size // block_bytes + 1))[:len(block) * size // block_bytes]
+
+
+def best_of(func, arg, repeat, min_time=0.05):
+    """Best seconds per call; fast calls are looped so each sample takes min_time"""
+    start = time.perf_counter()
+    func(arg)
+    loops = max(1, int(min_time / max(time.perf_counter() - start, 1e-9)))
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func(arg)
+        elapsed = (time.perf_counter() - start) / loops
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_decode(args):
+    size = int(args.size_mb * 1024 * 1024)
+    corpora = {
+        "ascii": make_text(size),
+        "non-ascii": make_text(size, "Ünïcödé tëxt wïth äccénts — “quotes”. "),
+        # No-break and ideographic spaces are not printable, like the characters decode_text looks for
+        "nbsp": make_text(size, "Prices\xa0start at\xa010\xa0€ per page.\n"),
+        "cjk": make_text(size // 3, "漢字と日本語のテキスト。\u3000中文文本，한국어 텍스트.\n"),
+        "mixed": make_corpus(size),
+        "encoded": encode_text(make_text(size // 2)),
+    }
+    invisible_chars()  # Build the lookup outside of the timed region
+
+    print(f"{'corpus':<12}{'replace (s)':>14}{'decode_text (s)':>18}{'ratio':>9}")
+    over = []
+    for name, text in corpora.items():
+        baseline = best_of(lambda t: t.replace(ZERO_WIDTH_CHAR, ''), text, args.repeat)
+        current = best_of(decode_text, text, args.repeat)
+        ratio = current / baseline if baseline else float("inf")
+        print(f"{name:<12}{baseline:>14.3f}{current:>18.3f}{ratio:>9.2f}")
+        # Times under a millisecond are noise, not a ratio worth failing on
+        if ratio > args.max_ratio and current > 1e-3:
+            over.append(f"{name} ({ratio:.1f}x)")
+    if over:
+        print(f"slower than {args.max_ratio:g}x a single replace: " + ", ".join(over), file=sys.stderr)
+        return 1
+    return 0
+
+
+def bench_startup(args):
+    here = os.path.dirname(os.path.abspath(__file__))
+    commands = {
+        "python": ["-c", "pass"],
+        "import core": ["-c", "import ghostwriter_core"],
+        "cli, one text": [os.path.join(here, "antiantiplagiarism.py")],
+    }
+
+    print(f"{'command':<16}{'best (ms)':>12}{'median (ms)':>14}{'over python (ms)':>19}")
+    baseline = None
+    for name, command in commands.items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + command, cwd=here, input=b"hello world",
+                           stdout=subprocess.DEVNULL, check=True)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        best, median = timings[0], timings[len(timings) // 2]
+        baseline = best if baseline is None else baseline
+        print(f"{name:<16}{best:>12.1f}{median:>14.1f}{best - baseline:>19.1f}")
+
+
+def normalize_naively(text):
+    """The Normalizer's steps chained one pass after another"""
+    text = decode_text(text)
+    text = unicodedata.normalize("NFKC", text)
+    text = re.sub(r"\r\n?|[\x85\u2028\u2029]", "\n", text)
+    return re.sub(r"[^\S\n\r\x85\u2028\u2029]+", " ", text)
+
+
+def bench_normalize(args):
+    size = int(args.size_mb * 1024 * 1024)
+    chunk_size = int(args.chunk_kb * 1024)
+    corpora = {
+        "ascii": make_text(size),
+        "mixed": make_corpus(size),
+        "encoded": encode_text(make_corpus(size // 2)),
+        "crlf": make_corpus(size).replace("\n", "\r\n").replace(" ", "\u3000", size // 64),
+    }
+    normalizer = Normalizer()
+    invisible_chars()  # Build the lookup outside of the timed region
+
+    def streamed(text):
+        chunks = (text[i:i + chunk_size] for i in range(0, len(text), chunk_size))
+        return "".join(normalizer.stream(chunks))
+
+    print(f"{'corpus':<12}{'naive (s)':>12}{'fused (s)':>12}{'streamed (s)':>15}{'speed-up':>11}")
+    for name, text in corpora.items():
+        expected = normalize_naively(text)
+        if normalizer(text) != expected or streamed(text) != expected:
+            print(f"{name}: fused output differs from the naive chain", file=sys.stderr)
+            return 1
+        naive = best_of(normalize_naively, text, args.repeat)
+        fused = best_of(normalizer, text, args.repeat)
+        stream = best_of(streamed, text, args.repeat)
+        speedup = naive / fused if fused else float("inf")
+        print(f"{name:<12}{naive:>12.3f}{fused:>12.3f}{stream:>15.3f}{speedup:>10.2f}x")
+    return 0
+
+
+def hot_paths():
+    """(name, function, corpus kind) for each benchmarked code path"""
+    return [
+        ("encode", lambda t: encode_text(t), "plain"),
+        ("encode single_char", lambda t: encode_text(t, single_char=True), "plain"),
+        ("decode", decode_text, "encoded"),
+        ("normalize", Normalizer(), "encoded"),
+        ("calc_entropy", calc_entropy, "plain"),
+        ("get_text_statistics", lambda t: get_text_statistics(decode_text(t), t), "encoded"),
+    ]
+
+
+def measure_memory(func, arg):
+    """Peak bytes allocated while func(arg) runs"""
+    tracemalloc.start()
+    try:
+        func(arg)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_suite(sizes, repeat, memory=True):
+    invisible_chars()  # Build the lookup outside of the timed region
+    results = {}
+    for size in sizes:
+        plain = make_corpus(size)
+        corpora = {"plain": plain, "encoded": encode_text(plain)}
+        for name, func, kind in hot_paths():
+            text = corpora[kind]
+            nbytes = len(text.encode("utf-8"))
+            seconds = best_of(func, text, repeat)
+            entry = {
+                "bytes": nbytes,
+                "seconds": seconds,
+                "mb_per_s": nbytes / (1 << 20) / seconds if seconds else float("inf"),
+            }
+            if memory:
+                entry["peak_bytes"] = measure_memory(func, text)
+            results[f"{name} @ {format_size(size)}"] = entry
+    return results
+
+
+def compare_results(results, baseline, tolerance):
+    """Return a list of regressions of more than `tolerance` against `baseline`"""
+    regressions = []
+    for key, entry in results.items():
+        old = baseline.get(key)
+        if not old:
+            continue
+        if entry["mb_per_s"] < old["mb_per_s"] * (1 - tolerance):
+            regressions.append(f"{key}: {old['mb_per_s']:.1f} -> {entry['mb_per_s']:.1f} MB/s")
+        if "peak_bytes" in entry and "peak_bytes" in old and \
+                entry["peak_bytes"] > old["peak_bytes"] * (1 + tolerance) + (64 << 10):
+            regressions.append(f"{key}: peak {old['peak_bytes'] / (1 << 20):.1f} -> "
+                               f"{entry['peak_bytes'] / (1 << 20):.1f} MB")
+    return regressions
+
+
+def bench_suite(args):
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    results = run_suite(sizes, args.repeat, memory=not args.no_memory)
+
+    print(f"{'benchmark':<30}{'MB/s':>10}{'peak MB':>10}")
+    for key, entry in results.items():
+        peak = f"{entry['peak_bytes'] / (1 << 20):.1f}" if "peak_bytes" in entry else "-"
+        print(f"{key:<30}{entry['mb_per_s']:>10.1f}{peak:>10}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+        print(f"\nBaseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_results(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.compare}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions against {args.compare}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GhostWriter transforms")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    suite_parser = subparsers.add_parser("suite", help="all hot paths across corpus sizes")
+    suite_parser.add_argument("--sizes", default="1K,64K,1M,16M",
+                              help="comma-separated corpus sizes, e.g. 1K,1M,1G (default: 1K,64K,1M,16M)")
+    suite_parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, best is kept")
+    suite_parser.add_argument("--no-memory", action="store_true",
+                              help="skip the tracemalloc run (much faster on large sizes)")
+    suite_parser.add_argument("--save", metavar="FILE", help="store the results as a JSON baseline")
+    suite_parser.add_argument("--compare", metavar="FILE", help="compare against a stored baseline")
+    suite_parser.add_argument("--tolerance", type=float, default=0.2,
+                              help="allowed slowdown or memory growth before failing (default: 0.2)")
+    suite_parser.set_defaults(func=bench_suite)
+
+    decode_parser = subparsers.add_parser("decode", help="decode_text against a single str.replace")
+    decode_parser.add_argument("--size-mb", type=float, default=100, help="corpus size in MB (default: 100)")
+    decode_parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, best is kept")
+    decode_parser.add_argument("--max-ratio", type=float, default=1.0,
+                               help="fail when decode_text takes longer than this many single replaces (default: 1)")
+    decode_parser.set_defaults(func=bench_decode)
+
+    startup_parser = subparsers.add_parser("startup", help="interpreter start-up plus import cost")
+    startup_parser.add_argument("--repeat", type=int, default=20, help="processes started per measurement")
+    startup_parser.set_defaults(func=bench_startup)
+
+    normalize_parser = subparsers.add_parser("normalize", help="the fused Normalizer against chaining its steps")
+    normalize_parser.add_argument("--size-mb", type=float, default=16, help="corpus size in MB (default: 16)")
+    normalize_parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, best is kept")
+    normalize_parser.add_argument("--chunk-kb", type=float, default=64,
+                                  help="chunk size for the streamed run in KB (default: 64)")
+    normalize_parser.set_defaults(func=bench_normalize)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
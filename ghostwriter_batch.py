@@ -0,0 +1,1065 @@
+"""Batch processing shared by the GhostWriter GUI and CLI.
+
+BatchJob transforms many files on a process pool, skipping the ones a
+previous run already did (the manifest) and resuming where an interrupted
+one stopped (the journal), with zip and tar archives as input or output.
+FolderWatcher feeds the CLI's watch mode. Like ghostwriter_core, this module
+only depends on the standard library and imports the rest on first use.
+"""
+import io
+import os
+import time
+
+from ghostwriter_core import (
+    NO_PROFILE,
+    WRITE_BUFFER_SIZE,
+    AtomicFile,
+    Profile,
+    decode_file_mmap,
+    iter_files,
+    matches_any,
+    open_text,
+    sync_directory,
+    sync_outputs,
+    transform_file,
+    transform_stream,
+)
+
+MMAP_MIN_SIZE = 1 << 26  # Batch decodes of files this large skip statistics and use decode_file_mmap
+MANIFEST_VERSION = 1
+JOURNAL_VERSION = 1
+PREFETCH_MAX_SIZE = 1 << 20  # Batch inputs up to this many bytes are read ahead by a thread pool
+PREFETCH_THREADS = 8
+IN_MEMORY_MAX_SIZE = 1 << 24  # Larger inputs are spooled to disk even when their output goes into an archive
+WATCH_SETTLE = 0.3  # Seconds a watched file must go unmodified before it is picked up
+ARCHIVE_SUFFIXES = {
+    ".zip": ("zip", ""),
+    ".tar": ("tar", ""),
+    ".tar.gz": ("tar", "gz"),
+    ".tgz": ("tar", "gz"),
+    ".tar.bz2": ("tar", "bz2"),
+    ".tar.xz": ("tar", "xz"),
+}
+
+
+def link_file(source, path, fsync=False):
+    """Make path a hardlink to the file at source, replacing any file at path atomically
+
+    Where hardlinks are not supported (FAT, other devices) source is copied
+    instead. Batch outputs are only ever replaced by renaming, never
+    rewritten in place, so linked outputs cannot change with each other.
+    """
+    import shutil
+
+    if os.path.abspath(source) == os.path.abspath(path):
+        return
+    directory, name = os.path.split(path)
+    temp_path = os.path.join(directory, f".{name}.{os.getpid()}.{os.urandom(4).hex()}.tmp")
+    try:
+        os.link(source, temp_path)
+    except OSError:
+        with open(source, 'rb') as src, AtomicFile(path, 'wb', fsync=fsync) as dst:
+            shutil.copyfileobj(src, dst, WRITE_BUFFER_SIZE)
+        return
+    try:
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    if fsync:
+        sync_directory(directory)
+
+
+def fingerprint_file(path, max_size=PREFETCH_MAX_SIZE):
+    """Return (size, mtime_ns, sha256, contents) for files up to max_size bytes
+
+    Larger files are not read here, so their sha256 and contents are None:
+    whoever processes them hashes them in the same pass (see process_file).
+    """
+    import hashlib
+
+    with open(path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        if stat.st_size > max_size:
+            return stat.st_size, stat.st_mtime_ns, None, None
+        contents = f.read()
+        return stat.st_size, stat.st_mtime_ns, hashlib.sha256(contents).hexdigest(), contents
+
+
+def process_file(operation, input_path, output_dir, single_char=False, subdir="", prefetched=None,
+                 profile=False, trace_memory=False, fsync=False, in_memory=False):
+    """Batch worker: transform one file into output_dir, or into subdir below it
+
+    prefetched is read_small_file's result when the input was already read
+    (or, for archive members, has no file of its own); its contents may
+    also be the path of a copy, as iter_archive_members spools. The output appears
+    complete or not at all, and with fsync only once it is on disk. With
+    in_memory, the output of inputs up to IN_MEMORY_MAX_SIZE bytes is not
+    written but returned as bytes ("data"), e.g. to go into an archive.
+    Returns a dict with the new file's path relative to output_dir ("output"),
+    the input and output EntropyAccumulators, and the input's size, mtime and
+    SHA-256 as read. Files of MMAP_MIN_SIZE bytes or more are decoded with
+    decode_file_mmap, which gathers no statistics, so both accumulators are
+    None for them. Line endings are kept as they are either way, but only
+    decode_file_mmap passes invalid UTF-8 through: the other paths raise
+    UnicodeDecodeError, and the input is reported as failed. With profile, the stages of the job are returned as well
+    ("profile"), ready for Profile.merge; trace_memory adds their peak memory.
+    """
+    import hashlib
+
+    profile = Profile(trace_memory) if profile else NO_PROFILE
+    new_filename = output_name(operation, input_path, subdir)
+    output_path = os.path.join(output_dir, new_filename)
+    hasher = hashlib.sha256()
+    if prefetched is not None:
+        size, mtime_ns, source = prefetched
+    else:
+        # Taken before reading: if the file changes meanwhile, the next run notices
+        stat = os.stat(input_path)
+        size, mtime_ns, source = stat.st_size, stat.st_mtime_ns, input_path
+    data = None
+    try:
+        if in_memory and size <= IN_MEMORY_MAX_SIZE:
+            data, input_stats, output_stats = transform_to_bytes(operation, source, single_char, hasher, profile)
+        elif operation == "decode" and size >= MMAP_MIN_SIZE and prefetched is None:
+            if subdir:
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            decode_file_mmap(input_path, output_path, hasher=hasher, profile=profile, fsync=fsync)
+            input_stats = output_stats = None
+        else:
+            if subdir:
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            input_stats, output_stats = transform_file(operation, source, output_path, single_char,
+                                                       hasher=hasher, profile=profile, fsync=fsync)
+    finally:
+        if profile.enabled:
+            profile.close()
+    return {
+        "output": new_filename,
+        "input_stats": input_stats,
+        "output_stats": output_stats,
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "sha256": hasher.hexdigest(),
+        "profile": profile.stages if profile.enabled else None,
+        "data": data,
+    }
+
+
+def journal_path_for(output_dir):
+    """The journal of the batch job writing to output_dir, next to its manifest"""
+    return os.path.normpath(output_dir) + ".journal.jsonl"
+
+
+class BatchJournal:
+    """Append-only log of a batch job, one JSON record per line
+
+    A job starts with a "start" record describing it (operation, the file
+    list or the folder walk) and logs a "done" record with the manifest
+    entry of every file as soon as it is written, plus "error" records. A
+    cancelled job ends with "cancelled"; a crashed one just stops. Either
+    way read_journal and replay_journal bring the manifest up to date, so
+    resuming the job skips everything already done. Each record is flushed
+    as it is written, and with fsync also synced to disk.
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self.file = None
+
+    def start(self, operation, single_char=False, inputs=None, root=None, walk=None):
+        """Begin a new job, replacing any previous journal"""
+        import uuid
+
+        self.file = open(self.path, 'w', encoding="utf-8")
+        self.record("start", version=JOURNAL_VERSION, job=uuid.uuid4().hex, time=time.time(),
+                    operation=operation, single_char=single_char, inputs=inputs, root=root, walk=walk)
+
+    def resume(self):
+        """Continue the job already in the journal"""
+        self.file = open(self.path, 'a', encoding="utf-8")
+        self.record("resume", time=time.time())
+
+    def record(self, event, **fields):
+        import json
+
+        fields["event"] = event
+        self.file.write(json.dumps(fields, ensure_ascii=False) + "\n")
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def discard(self):
+        """Close and delete the journal once its job is complete"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def read_journal(path):
+    """Return the job logged at path as a dict, or None if there is none
+
+    The dict holds the "start" record, the "done" and "error" records, and
+    "end": "cancelled", or None for a job that was interrupted. A torn last
+    line, as a crash mid-write leaves behind, is ignored.
+    """
+    import json
+
+    try:
+        f = open(path, 'r', encoding="utf-8")
+    except OSError:
+        return None
+    job = {"start": None, "done": [], "errors": [], "end": None}
+    with f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            event = record.get("event")
+            if event == "start":
+                if record.get("version") != JOURNAL_VERSION:
+                    return None
+                job["start"] = record
+            elif event == "done":
+                job["done"].append(record)
+            elif event == "error":
+                job["errors"].append(record)
+            elif event == "cancelled":
+                job["end"] = event
+            elif event == "resume":
+                job["end"] = None
+    return job if job["start"] else None
+
+
+def replay_journal(manifest, job):
+    """Add the files a journalled job completed to the manifest; return how many"""
+    for record in job["done"]:
+        manifest["entries"][manifest_key(record["path"])] = record["entry"]
+    return len(job["done"])
+
+
+def transform_to_bytes(operation, source, single_char=False, hasher=None, profile=None):
+    """transform_file into memory: return the UTF-8 output and the two EntropyAccumulators"""
+    output = io.BytesIO()
+    with open_text(source, hasher) as src:
+        dst = io.TextIOWrapper(output, encoding="utf-8", newline="")
+        input_stats, output_stats = transform_stream(operation, src, dst, single_char, profile=profile)
+        dst.flush()
+        data = output.getvalue()
+        dst.detach()
+    return data, input_stats, output_stats
+
+
+def archive_format(path):
+    """("zip" or "tar", compression) for an archive file name, None for other names"""
+    lower = path.lower()
+    for suffix, archive_type in ARCHIVE_SUFFIXES.items():
+        if lower.endswith(suffix):
+            return archive_type
+    return None
+
+
+def archive_member_path(name):
+    """An archive member's name as a relative path that cannot escape the folder it is written to"""
+    parts = [part for part in name.replace("\\", "/").split("/") if part not in ("", ".", "..")]
+    return os.path.join(*parts) if parts else "member"
+
+
+class ArchiveWriter:
+    """Context manager adding members one by one to a new zip or tar archive, written atomically
+
+    The format follows the file name (see ARCHIVE_SUFFIXES). compression_level
+    is 0-9 for .zip, .tar.gz and .tar.bz2, and the preset for .tar.xz; None
+    keeps the format's default, and 0 stores zip members uncompressed.
+    """
+
+    def __init__(self, path, compression_level=None, fsync=False):
+        self.path = path
+        self.archive_type = archive_format(path)
+        if self.archive_type is None:
+            raise ValueError(f"{path}: archive names must end in " + ", ".join(ARCHIVE_SUFFIXES))
+        self.compression_level = compression_level
+        # Zip members are read back for add_reference
+        self.atomic = AtomicFile(path, 'w+b' if self.archive_type[0] == "zip" else 'wb', fsync=fsync)
+        self.archive = None
+
+    def __enter__(self):
+        import tarfile
+        import zipfile
+
+        f = self.atomic.__enter__()
+        kind, compression = self.archive_type
+        level = self.compression_level
+        try:
+            if kind == "zip":
+                method = zipfile.ZIP_STORED if level == 0 else zipfile.ZIP_DEFLATED
+                self.archive = zipfile.ZipFile(f, 'w', method, compresslevel=level or None)
+            else:
+                options = {}
+                if level is not None and compression == "xz":
+                    options["preset"] = level
+                elif level is not None and compression:
+                    options["compresslevel"] = level
+                self.archive = tarfile.open(fileobj=f, mode=f"w:{compression}", **options)
+        except BaseException as e:
+            self.atomic.__exit__(type(e), e, e.__traceback__)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.archive.close()
+        except BaseException as e:
+            self.atomic.__exit__(type(e), e, e.__traceback__)
+            raise
+        self.atomic.__exit__(exc_type, exc_value, traceback)
+
+    def add(self, name, data=None, path=None, mtime_ns=None):
+        """Add a member from bytes, or streamed from the file at path; name uses / separators"""
+        import tarfile
+        import zipfile
+
+        mtime = mtime_ns / 1e9 if mtime_ns is not None else time.time()
+        if self.archive_type[0] == "zip":
+            # Zip timestamps start in 1980
+            mtime = max(mtime, 315619200)
+            if path is not None:
+                os.utime(path, ns=(int(mtime * 1e9),) * 2)
+                self.archive.write(path, arcname=name)
+                return
+            info = zipfile.ZipInfo(name, date_time=time.localtime(mtime)[:6])
+            info.external_attr = 0o644 << 16
+            self.archive.writestr(info, data, compress_type=self.archive.compression,
+                                  compresslevel=self.archive.compresslevel)
+            return
+        if path is not None:
+            info = self.archive.gettarinfo(path, arcname=name)
+            info.mtime = mtime
+            with open(path, 'rb') as f:
+                self.archive.addfile(info, f)
+            return
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = mtime
+        info.mode = 0o644
+        self.archive.addfile(info, io.BytesIO(data))
+
+    def add_reference(self, name, target, mtime_ns=None):
+        """Add a member with the same contents as the earlier member target
+
+        In a tar it is a hardlink to target and takes no space. Zip has no
+        links, so target is read back and stored again, which still saves
+        producing the contents a second time.
+        """
+        import shutil
+        import tarfile
+        import tempfile
+
+        if self.archive_type[0] == "zip":
+            if self.archive.getinfo(target).file_size <= IN_MEMORY_MAX_SIZE:
+                self.add(name, data=self.archive.read(target), mtime_ns=mtime_ns)
+                return
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(self.path)), delete=False) as spool:
+                with self.archive.open(target) as src:
+                    shutil.copyfileobj(src, spool, WRITE_BUFFER_SIZE)
+            try:
+                self.add(name, path=spool.name, mtime_ns=mtime_ns)
+            finally:
+                os.remove(spool.name)
+            return
+        info = tarfile.TarInfo(name)
+        info.type = tarfile.LNKTYPE
+        info.linkname = target
+        info.mtime = mtime_ns / 1e9 if mtime_ns is not None else time.time()
+        info.mode = 0o644
+        self.archive.addfile(info)
+
+
+def iter_archive_members(path, include=(), exclude=(), max_size=None, spool_dir=None):
+    """Yield (member name, (size, mtime_ns, contents)) for the regular files in a zip or tar archive
+
+    Members are read one at a time in archive order, so a corpus never has
+    to be unpacked to disk. Members over IN_MEMORY_MAX_SIZE bytes are the
+    exception: each is copied to a new temporary file in spool_dir, whose
+    path then takes the place of contents and which the caller deletes.
+    Hardlinks in a tar (as written by ArchiveWriter.add_reference) yield
+    their target's contents. include and exclude work as in iter_files, on
+    the member's base name or its path in the archive, and exclude also
+    skips members below matching folders.
+    """
+    import shutil
+    import tarfile
+    import tempfile
+    import zipfile
+    from collections import OrderedDict
+
+    def wanted(name, size):
+        parts = name.split("/")
+        if exclude and any(matches_any(part, name, exclude) for part in parts):
+            return False
+        if include and not matches_any(parts[-1], name, include):
+            return False
+        return max_size is None or size <= max_size
+
+    def spool(src):
+        with src, tempfile.NamedTemporaryFile(dir=spool_dir, prefix=".member-", delete=False) as f:
+            shutil.copyfileobj(src, f, WRITE_BUFFER_SIZE)
+        return f.name
+
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not wanted(info.filename, info.file_size):
+                    continue
+                mtime_ns = int(time.mktime(info.date_time + (0, 0, -1)) * 1e9)
+                if info.file_size > IN_MEMORY_MAX_SIZE:
+                    contents = spool(archive.open(info))
+                else:
+                    contents = archive.read(info)
+                yield info.filename, (info.file_size, mtime_ns, contents)
+        return
+    with tarfile.open(path, "r:*") as archive:
+        files = {}
+        # Links usually follow their target closely; recent small members are
+        # kept so that compressed tars need not be decompressed again to reach it
+        recent = OrderedDict()
+        recent_size = 0
+        for member in archive:
+            if member.isfile():
+                files[member.name] = member
+                target = member
+            elif member.islnk() and member.linkname in files:
+                target = files[member.linkname]
+            else:
+                continue
+            if not wanted(member.name, target.size):
+                continue
+            data = recent.get(target.name)
+            if data is None and target.size > IN_MEMORY_MAX_SIZE:
+                data = spool(archive.extractfile(target))
+            elif data is None:
+                data = archive.extractfile(target).read()
+                if len(data) <= PREFETCH_MAX_SIZE:
+                    recent[target.name] = data
+                    recent_size += len(data)
+                    while recent_size > IN_MEMORY_MAX_SIZE:
+                        recent_size -= len(recent.popitem(last=False)[1])
+            yield member.name, (target.size, int(member.mtime * 1e9), data)
+
+
+def output_name(operation, input_path, subdir=""):
+    return os.path.join(subdir, f"{operation}d_{os.path.basename(input_path)}")
+
+
+def hash_file(path, chunk_size=1 << 20):
+    import hashlib
+
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def manifest_path_for(output_dir):
+    """The manifest lives next to the output directory it describes"""
+    return os.path.normpath(output_dir) + ".manifest.json"
+
+
+def load_manifest(path):
+    """Read a batch manifest, starting afresh if it is missing, unreadable or outdated (or path is None)"""
+    import json
+
+    manifest = None
+    if path is not None:
+        try:
+            with open(path, 'r', encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            pass
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        manifest = {"version": MANIFEST_VERSION, "entries": {}}
+    return manifest
+
+
+def save_manifest(path, manifest, fsync=False):
+    import json
+
+    with AtomicFile(path, 'w', "utf-8", fsync=fsync) as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def manifest_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def record_in_manifest(manifest, input_path, operation, single_char, result, output=None):
+    """Record result as input_path's entry; output is the os.stat of the file written, if any"""
+    entry = {
+        "operation": operation,
+        "single_char": single_char,
+        "output": result["output"],
+        "size": result["size"],
+        "mtime_ns": result["mtime_ns"],
+        "sha256": result["sha256"],
+    }
+    if output is not None:
+        entry["output_size"] = output.st_size
+        entry["output_mtime_ns"] = output.st_mtime_ns
+    manifest["entries"][manifest_key(input_path)] = entry
+    return entry
+
+
+def is_unchanged(manifest, input_path, operation, single_char, output_dir):
+    """True when input_path was already processed the same way and has not changed since
+
+    Size and mtime decide on their own when they match; if only the mtime
+    moved, the content hash settles it (and the stored mtime is refreshed).
+    The output must also still be the file recorded: inputs with the same
+    name from different folders share an output name, and the one done last
+    replaced the others' outputs.
+    """
+    entry = manifest["entries"].get(manifest_key(input_path))
+    if not entry or entry["operation"] != operation or entry["single_char"] != single_char:
+        return False
+    try:
+        output = os.stat(os.path.join(output_dir, entry["output"]))
+    except OSError:
+        return False
+    if (output.st_size, output.st_mtime_ns) != (entry.get("output_size"), entry.get("output_mtime_ns")):
+        return False
+    try:
+        stat = os.stat(input_path)
+    except OSError:
+        return False
+    if stat.st_size != entry["size"]:
+        return False
+    if stat.st_mtime_ns == entry["mtime_ns"]:
+        return True
+    try:
+        if hash_file(input_path) != entry["sha256"]:
+            return False
+    except OSError:
+        return False
+    entry["mtime_ns"] = stat.st_mtime_ns
+    return True
+
+
+def prune_manifest(manifest, output_dir, scope):
+    """Forget inputs within scope that no longer exist and delete their outputs; return the pruned paths
+
+    scope lists the folders and files the current job covers. Entries from
+    anywhere else, such as a drive that is not mounted right now, are kept,
+    and so are those below a folder of scope that is itself missing.
+    """
+    paths = {manifest_key(path) for path in scope}
+    prefixes = tuple(path.rstrip(os.sep) + os.sep for path in paths if os.path.isdir(path))
+    pruned = []
+    for key, entry in list(manifest["entries"].items()):
+        if not (key in paths or key.startswith(prefixes)) or os.path.exists(key):
+            continue
+        del manifest["entries"][key]
+        pruned.append(key)
+        # Inputs from different folders can share an output name
+        if any(other["output"] == entry["output"] for other in manifest["entries"].values()):
+            continue
+        try:
+            os.remove(os.path.join(output_dir, entry["output"]))
+        except OSError:
+            pass
+    return pruned
+
+
+def read_small_file(path, max_size=PREFETCH_MAX_SIZE):
+    """Return (size, mtime_ns, contents) for files up to max_size bytes, None for larger ones"""
+    with open(path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        if stat.st_size > max_size:
+            return None
+        return stat.st_size, stat.st_mtime_ns, f.read()
+
+
+def iter_prefetched(paths, threads=PREFETCH_THREADS, max_size=PREFETCH_MAX_SIZE, reader=read_small_file):
+    """Yield (path, future) pairs in order, with small files read ahead on a thread pool
+
+    Each future resolves to reader(path, max_size): read_small_file's
+    result, or with reader=fingerprint_file the content hash as well. At most
+    2 * threads files are read ahead, so memory stays bounded while slow or
+    network disks keep working in parallel with whoever consumes the pairs.
+    """
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(threads) as readers:
+        window = deque()
+        for path in paths:
+            window.append((path, readers.submit(reader, path, max_size)))
+            if len(window) >= threads * 2:
+                yield window.popleft()
+        while window:
+            yield window.popleft()
+
+
+class BatchJob:
+    """A batch run transforming files on a process pool, reporting through a queue
+
+    The inputs are a list of paths, the files below root found by
+    iter_files(root, **walk), or with archive_input the members of that zip
+    or tar (walk filters them too). Outputs go below output_dir, mirroring
+    the folders below root or inside the input archive, or with
+    archive_output into a new archive instead. Jobs without archives are
+    journalled and skip the inputs the manifest has as unchanged, so a job
+    that was cancelled or interrupted picks up where it stopped when it is
+    run again with resume=True. fsync is one of FSYNC_MODES.
+
+    run() does the work on the calling thread and start() on a new one.
+    Either puts (kind, path, value) tuples on self.events: "done" with
+    process_file's result (plus "duplicate_of" for an input whose output
+    links to that of an earlier input with the same content), "skipped",
+    "found" with the number of inputs once the last one is known, "pruned"
+    with the number of deleted inputs whose outputs were removed, "error"
+    with a message, and "finished" once everything is closed.
+    """
+
+    def __init__(self, operation, output_dir=None, inputs=None, root=None, walk=None, resume=False,
+                 archive_input=None, archive_output=None, compression_level=None, fsync="none",
+                 workers=None, profile=NO_PROFILE, trace_memory=False):
+        import queue
+        import threading
+
+        self.operation = operation
+        self.output_dir = output_dir
+        self.root = root
+        self.walk = walk
+        self.resume = resume
+        self.archive_input = archive_input
+        self.archive_output = archive_output
+        self.compression_level = compression_level
+        self.fsync = fsync
+        self.workers = workers or os.cpu_count() or 1
+        # Workers profile their own stages and send them back to be merged here
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.incremental = archive_input is None and archive_output is None
+        if archive_input:
+            # Read in run(), once there is a folder for spooling large members
+            inputs = None
+        elif inputs is None:
+            # A lazy walk: processing starts with the first file found
+            inputs = iter_files(root, **(walk or {}))
+        self.inputs = inputs
+        # Unknown until a lazy folder walk has finished
+        self.total = len(inputs) if isinstance(inputs, (list, tuple)) else None
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.completed = False
+        self.members_dir = None
+
+    def start(self):
+        import threading
+
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+        return thread
+
+    def cancel(self):
+        """Stop after the files in flight; the job still finishes as usual"""
+        self.cancel_event.set()
+
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def emit(self, kind, path=None, value=None):
+        self.events.put((kind, path, value))
+
+    def run(self):
+        import shutil
+        import tempfile
+        from concurrent.futures import ProcessPoolExecutor
+        from contextlib import nullcontext
+
+        profile = self.profile
+        self.manifest = None
+        self.journal = None
+        self.journal_failed = False
+        self.archive = None
+        self.archived = 0
+        self.pending = {}
+        self.written = []
+        # Each content is transformed once: later inputs with the same
+        # SHA-256 get a link to the first one's output. originals maps a
+        # hash to the first input and its output (None while it runs),
+        # waiting to the copies found meanwhile. Inputs too large to prefetch
+        # are hashed by their worker, so their copies are still transformed
+        # but then linked all the same
+        self.originals = {}
+        self.waiting = {}
+        try:
+            if self.archive_output:
+                # Outputs too large to keep in memory wait here for their turn in the archive
+                self.output_dir = tempfile.mkdtemp(prefix=".ghostwriter-spool-",
+                                                   dir=os.path.dirname(os.path.abspath(self.archive_output)))
+            else:
+                os.makedirs(self.output_dir, exist_ok=True)
+            if self.archive_input:
+                # Members too large to pass to the workers in memory are copied here
+                self.members_dir = tempfile.mkdtemp(prefix=".ghostwriter-members-", dir=self.output_dir)
+                walk = dict(self.walk or {})
+                walk.pop("recursive", None)
+                self.inputs = iter_archive_members(self.archive_input, spool_dir=self.members_dir, **walk)
+            # Inputs recorded in the manifest as unchanged since the last run
+            # are skipped; outputs of inputs that were deleted are pruned
+            manifest_path = manifest_path_for(self.output_dir)
+            with profile.stage("manifest"):
+                self.manifest = load_manifest(manifest_path if self.incremental else None)
+            if self.incremental:
+                # Every file finished is journalled at once; files done by a job
+                # that was cancelled or interrupted count as unchanged from here on
+                self.journal = BatchJournal(journal_path_for(self.output_dir), fsync=self.fsync != "none")
+                previous = read_journal(self.journal.path)
+                if previous:
+                    replay_journal(self.manifest, previous)
+                if self.resume and previous:
+                    self.journal.resume()
+                else:
+                    self.journal.start(self.operation, False, self.inputs if isinstance(self.inputs, list) else None,
+                                       self.root, self.walk)
+                pruned = prune_manifest(self.manifest, self.output_dir,
+                                        [self.root] if self.root is not None else self.inputs)
+                if pruned:
+                    self.emit("pruned", value=len(pruned))
+            # A cancelled job still closes the archive, holding the members
+            # done so far; a failed one leaves no archive behind
+            archive_context = (ArchiveWriter(self.archive_output, self.compression_level, self.fsync != "none")
+                               if self.archive_output else nullcontext())
+            with ProcessPoolExecutor(self.workers) as pool, archive_context as self.archive:
+                try:
+                    self.dispatch(pool)
+                finally:
+                    # Record whatever was still running when the run was cancelled
+                    pool.shutdown(cancel_futures=True)
+                    while self.pending:
+                        self.collect(block=True)
+        except Exception as e:
+            self.emit("error", value=str(e))
+        finally:
+            try:
+                # Outputs go to disk before the manifest that vouches for them
+                if self.fsync == "batch" and self.written:
+                    with profile.stage("sync"):
+                        sync_outputs(self.written)
+            except OSError as e:
+                self.emit("error", value=f"Could not flush the outputs to disk: {e}")
+            if self.incremental and self.manifest is not None:
+                try:
+                    with profile.stage("manifest"):
+                        save_manifest(manifest_path, self.manifest, fsync=self.fsync != "none")
+                except OSError as e:
+                    self.completed = False
+                    self.emit("error", value=f"Could not save the manifest: {e}")
+            if self.journal is not None and self.journal.file is not None:
+                # A finished job needs no journal any more; any other is kept to be resumed
+                if self.completed:
+                    self.journal.discard()
+                else:
+                    if self.cancelled():
+                        self.log("cancelled")
+                    self.journal.close()
+            if self.members_dir is not None:
+                shutil.rmtree(self.members_dir, ignore_errors=True)
+            if self.archive_output:
+                if self.output_dir is not None:
+                    shutil.rmtree(self.output_dir, ignore_errors=True)
+                if not self.archived:
+                    try:
+                        os.remove(self.archive_output)
+                    except OSError:
+                        pass
+            self.emit("finished")
+
+    def dispatch(self, pool):
+        """Feed the inputs to the pool, a few jobs per worker at a time"""
+        # Small files are read ahead on a thread pool while the process pool
+        # transforms earlier ones, so memory stays bounded
+        jobs = (self.archive_members() if self.archive_input
+                else iter_prefetched(self.to_process(), reader=fingerprint_file))
+        for path, read in jobs:
+            if self.cancelled():
+                break
+            try:
+                # Time spent waiting here means reading is the bottleneck
+                with self.profile.stage("prefetch") as stage:
+                    size, mtime_ns, digest, contents = read.result()
+                    stage.size = size
+            except OSError as e:
+                self.emit("error", path, str(e))
+                continue
+            if digest in self.originals:
+                if self.originals[digest][1] is None:
+                    self.waiting[digest].append((path, size, mtime_ns))
+                else:
+                    self.store_duplicate(path, size, mtime_ns, digest)
+                continue
+            if digest is not None:
+                self.originals[digest] = (path, None)
+                self.waiting[digest] = []
+            # Larger files are left for the worker to read (or memory-map)
+            prefetched = (size, mtime_ns, contents) if contents is not None else None
+            future = pool.submit(process_file, self.operation, path, self.output_dir, False,
+                                 self.output_subdir(path), prefetched, self.profile.enabled, self.trace_memory,
+                                 self.fsync == "file" and self.archive is None, self.archive is not None)
+            # A spooled archive member is deleted once its worker is done with it
+            spooled = contents if isinstance(contents, str) else None
+            self.pending[future] = (path, digest, spooled)
+            self.collect(block=False)
+            while len(self.pending) >= self.workers * 4:
+                self.collect(block=True)
+        while self.pending and not self.cancelled():
+            self.collect(block=True)
+        self.completed = not self.cancelled()
+
+    def to_process(self):
+        found = 0
+        output_prefix = os.path.join(os.path.abspath(self.output_dir), "")
+        for path in self.inputs:
+            if self.cancelled():
+                return
+            # A folder walk may reach our own output; never feed it back in
+            if os.path.abspath(path).startswith(output_prefix):
+                continue
+            found += 1
+            if is_unchanged(self.manifest, path, self.operation, False, self.output_dir):
+                self.emit("skipped", path)
+            else:
+                yield path
+        self.emit("found", value=found)
+
+    def archive_members(self):
+        # Members are read one at a time with their contents (or the path of
+        # a spooled copy), so they arrive as if prefetched and fingerprinted;
+        # like large files, large members are hashed by their worker
+        import hashlib
+        from concurrent.futures import Future
+
+        found = 0
+        for name, (size, mtime_ns, contents) in self.inputs:
+            if self.cancelled():
+                return
+            found += 1
+            small = isinstance(contents, bytes) and size <= PREFETCH_MAX_SIZE
+            digest = hashlib.sha256(contents).hexdigest() if small else None
+            read = Future()
+            read.set_result((size, mtime_ns, digest, contents))
+            yield name, read
+        self.emit("found", value=found)
+
+    def output_subdir(self, path):
+        # Mirror the folder structure below root, or inside the input
+        # archive, so equal names never collide
+        if self.archive_input:
+            return os.path.dirname(archive_member_path(path))
+        if self.root is None:
+            return ""
+        relative = os.path.relpath(os.path.dirname(path), self.root)
+        return "" if relative == os.curdir else relative
+
+    def log(self, event, **fields):
+        if self.journal is None:
+            return
+        try:
+            self.journal.record(event, **fields)
+        except (OSError, ValueError) as e:
+            if not self.journal_failed:
+                self.journal_failed = True
+                self.emit("error", value=f"Could not write the journal: {e}")
+
+    def collect(self, block):
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        if not self.pending:
+            return
+        done, _ = wait(self.pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            path, digest, spooled = self.pending.pop(future)
+            if spooled is not None:
+                try:
+                    os.remove(spooled)
+                except OSError:
+                    pass
+            if future.cancelled():
+                continue
+            try:
+                result = future.result()
+            except Exception as e:
+                self.log("error", path=path, error=str(e))
+                self.emit("error", path, str(e))
+                error = str(e)
+            else:
+                if result["profile"]:
+                    self.profile.merge(result["profile"])
+                if digest is None:
+                    # Large inputs are only hashed by their worker; a copy of
+                    # one already done gives up its output for a link
+                    digest = result["sha256"]
+                    if self.originals.get(digest, (None, None))[1] is not None:
+                        if self.archive is not None and result["data"] is None:
+                            try:
+                                os.remove(os.path.join(self.output_dir, result["output"]))
+                            except OSError:
+                                pass
+                        self.store_duplicate(path, result["size"], result["mtime_ns"], digest)
+                        continue
+                    self.originals[digest] = (path, None)
+                    self.waiting[digest] = []
+                error = self.store(path, result)
+            if digest is None:
+                continue
+            if error is None:
+                self.originals[digest] = (path, result["output"])
+                for copy in self.waiting.pop(digest):
+                    self.store_duplicate(*copy, digest)
+            else:
+                # A later copy gets a fresh try
+                del self.originals[digest]
+                for copy_path, _, _ in self.waiting.pop(digest):
+                    message = f"Same content as {os.path.basename(path)}, which failed: {error}"
+                    self.log("error", path=copy_path, error=message)
+                    self.emit("error", copy_path, message)
+
+    def store(self, path, result, original_output=None):
+        """Put a finished output in place and record it; return the error, if any
+
+        For a duplicate, the output is a link to original_output.
+        """
+        output = None
+        try:
+            if self.archive is not None:
+                self.add_to_archive(result, original_output)
+            else:
+                target = os.path.join(self.output_dir, result["output"])
+                if original_output is not None:
+                    with self.profile.stage("link"):
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        link_file(os.path.join(self.output_dir, original_output), target, self.fsync == "file")
+                output = os.stat(target)
+        except OSError as e:
+            self.log("error", path=path, error=str(e))
+            self.emit("error", path, str(e))
+            return str(e)
+        if output is not None:
+            self.written.append(target)
+        entry = record_in_manifest(self.manifest, path, self.operation, False, result, output)
+        self.log("done", path=path, entry=entry)
+        self.emit("done", path, result)
+        return None
+
+    def store_duplicate(self, path, size, mtime_ns, digest):
+        original_path, original_output = self.originals[digest]
+        result = {
+            "output": output_name(self.operation, path, self.output_subdir(path)),
+            "input_stats": None,
+            "output_stats": None,
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "sha256": digest,
+            "profile": None,
+            "data": None,
+            "duplicate_of": original_path,
+        }
+        self.store(path, result, original_output)
+
+    def add_to_archive(self, result, original_output=None):
+        # Members go in as soon as they are done, in completion order
+        data = result.pop("data")
+        name = result["output"].replace(os.sep, "/")
+        with self.profile.stage("archive") as stage:
+            if original_output is not None:
+                self.archive.add_reference(name, original_output.replace(os.sep, "/"), result["mtime_ns"])
+            elif data is not None:
+                stage.size = len(data)
+                self.archive.add(name, data=data, mtime_ns=result["mtime_ns"])
+            else:
+                spooled = os.path.join(self.output_dir, result["output"])
+                stage.size = os.path.getsize(spooled)
+                try:
+                    self.archive.add(name, path=spooled, mtime_ns=result["mtime_ns"])
+                finally:
+                    os.remove(spooled)
+        self.archived += 1
+
+
+class FolderWatcher:
+    """Poll a folder with os.scandir and report files once they have stopped changing
+
+    An index maps each file name to the size and mtime it had at the last
+    poll. A file is ready when both are unchanged since the previous poll and
+    the mtime is at least settle seconds old, so files still being written
+    are left alone. Each version of a file is reported once; if it changes
+    afterwards, it is reported again when it has settled. Subfolders and
+    hidden files (such as AtomicFile's temporary files) are ignored, and
+    include and exclude match the names as in iter_files.
+    """
+
+    def __init__(self, path, include=("*.txt",), exclude=(), settle=WATCH_SETTLE):
+        self.path = path
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+        self.settle = settle
+        self.index = {}  # name -> [size, mtime_ns, reported]
+
+    def poll(self):
+        """Scan the folder once; return the paths of the files that became ready"""
+        ready = []
+        seen = set()
+        now_ns = time.time_ns()
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith(".") or (self.exclude and matches_any(name, name, self.exclude)):
+                    continue
+                if self.include and not matches_any(name, name, self.include):
+                    continue
+                try:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                seen.add(name)
+                known = self.index.get(name)
+                if known is None or known[0] != stat.st_size or known[1] != stat.st_mtime_ns:
+                    self.index[name] = [stat.st_size, stat.st_mtime_ns, False]
+                    continue
+                if not known[2] and now_ns - stat.st_mtime_ns >= self.settle * 1e9:
+                    known[2] = True
+                    ready.append(entry.path)
+        for name in self.index.keys() - seen:
+            del self.index[name]
+        return ready
+
+    def signature(self, path):
+        """(size, mtime_ns) of path as last indexed, None if it is not indexed"""
+        known = self.index.get(os.path.basename(path))
+        return tuple(known[:2]) if known else None
+
+
+def move_to_folder(path, folder):
+    """Move a file into folder, adding a number to its name if one is taken there; return the new path"""
+    os.makedirs(folder, exist_ok=True)
+    stem, ext = os.path.splitext(os.path.basename(path))
+    target = os.path.join(folder, stem + ext)
+    number = 1
+    while os.path.exists(target):
+        target = os.path.join(folder, f"{stem}.{number}{ext}")
+        number += 1
+    os.replace(path, target)
+    return target
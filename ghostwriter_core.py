@@ -0,0 +1,1049 @@
+"""Text transforms and statistics shared by the GhostWriter GUI and CLI.
+
+This module only depends on the standard library so that it stays cheap to
+import; NumPy is loaded on first use when it is available.
+"""
+import io
+import math
+import mmap
+import os
+import sys
+import time
+import unicodedata
+from collections import Counter
+
+ZERO_WIDTH_CHAR = "\u200E"
+# The Cf (format) category as of Unicode 15.1, as (first, last) code points; a
+# constant, because asking unicodedata about every code point takes ~170 ms
+FORMAT_RANGES = (
+    (0x00AD, 0x00AD), (0x0600, 0x0605), (0x061C, 0x061C), (0x06DD, 0x06DD), (0x070F, 0x070F), (0x0890, 0x0891),
+    (0x08E2, 0x08E2), (0x180E, 0x180E), (0x200B, 0x200F), (0x202A, 0x202E), (0x2060, 0x2064), (0x2066, 0x206F),
+    (0xFEFF, 0xFEFF), (0xFFF9, 0xFFFB), (0x110BD, 0x110BD), (0x110CD, 0x110CD), (0x13430, 0x1343F),
+    (0x1BCA0, 0x1BCA3), (0x1D173, 0x1D17A), (0xE0001, 0xE0001), (0xE0020, 0xE007F),
+)
+# Blank-looking characters outside the Cf (format) category that are also removed when decoding
+INVISIBLE_BLANKS = "\u115F\u1160\u2800\u3164\uFFA0"
+CHUNK_SIZE = 1 << 20  # Characters read per chunk when streaming files
+SCAN_BLOCK = 1 << 16  # Characters invisible_chars_in rules out at a time with str.isprintable()
+# Common non-printable characters that are not invisible, ignored by that check
+PRINTABLE_EXCEPTIONS = "\n\r\t\xa0\u3000"
+NUMPY_MIN_LENGTH = 1 << 16  # Texts at least this long use the NumPy statistics backend, if installed
+MMAP_WINDOW = 1 << 24  # Bytes decoded at a time by decode_file_mmap
+WRITE_BUFFER_SIZE = 1 << 20  # Buffer of each output file written by AtomicFile
+FSYNC_MODES = ("none", "file", "batch")  # When batch outputs are flushed to disk, see sync_outputs
+NORMALIZE_STEPS = ("strip", "nfkc", "newlines", "whitespace")  # What Normalizer can do, in the order it does it
+NORMALIZE_LOOKBACK = 1 << 10  # Characters Normalizer.stream searches back for a safe place to cut a chunk
+
+
+def encode_word(word, single_char=False):
+    if single_char:
+        middle = len(word) // 2
+        return word[:middle] + ZERO_WIDTH_CHAR + word[middle:]
+    return ''.join(char + ZERO_WIDTH_CHAR for char in word)
+
+
+def encode_text(text, single_char=False):
+    return ' '.join(encode_word(word, single_char) for word in text.split())
+
+
+_invisible_chars = None
+
+
+def invisible_chars():
+    """Return every codepoint decode_text removes by default (built once, on first use)"""
+    global _invisible_chars
+    if _invisible_chars is None:
+        chars = {chr(cp) for first, last in FORMAT_RANGES for cp in range(first, last + 1)}
+        chars.update(INVISIBLE_BLANKS)
+        chars.add(ZERO_WIDTH_CHAR)
+        _invisible_chars = frozenset(chars)
+    return _invisible_chars
+
+
+def decode_text(text, chars=None, offsets=False, spans=False):
+    """Remove invisible characters from text
+
+    With offsets, return (decoded, offset map) instead, as decode_with_offsets
+    does; with spans too, (decoded, offset map, removed spans).
+    """
+    if offsets:
+        return decode_with_offsets(text, chars, spans)
+    if chars is None and text.isascii():
+        return text
+    if chars is None and ZERO_WIDTH_CHAR in text:
+        # What GhostWriter inserts goes first: in encoded text it is everywhere
+        text = text.replace(ZERO_WIDTH_CHAR, '')
+    # Then one replace() per other candidate that actually occurs. (Both
+    # str.translate and a compiled character-class regex step through the
+    # string one character at a time and are 10-30x slower.)
+    for char in invisible_chars_in(text, chars):
+        text = text.replace(char, '')
+    return text
+
+
+def invisible_chars_in(text, chars=None):
+    """Return the set of characters of invisible_chars() (or of chars) that occur in text
+
+    Format characters are never printable, so each SCAN_BLOCK of text that
+    str.isprintable() accepts, once line breaks, tabs, the common spaces of
+    PRINTABLE_EXCEPTIONS (unless chars has them) and the candidates already
+    found are taken out, is ruled out at C speed. Only the other blocks are
+    searched character by character. Printable candidates, such as
+    INVISIBLE_BLANKS, are looked for with one find each.
+    """
+    invisible = invisible_chars() if chars is None else frozenset(chars)
+    printable = INVISIBLE_BLANKS if chars is None else [char for char in invisible if char.isprintable()]
+    exceptions = [char for char in PRINTABLE_EXCEPTIONS if char not in invisible]
+    present = {char for char in printable if char in text}
+    if text.isprintable():
+        return present
+    for start in range(0, len(text), SCAN_BLOCK):
+        block = text[start:start + SCAN_BLOCK]
+        if block.isprintable():
+            continue
+        for char in exceptions:
+            if char in block:
+                block = block.replace(char, '')
+        for char in present:
+            if char in block:
+                block = block.replace(char, '')
+        if not block.isprintable():
+            present.update(invisible.intersection(block))
+    return present
+
+
+_invisible_table = None
+KEEP_MASK = bytes.maketrans(b'\x00\x01', b'\x01\x00')  # Turns a mask of removed characters into one of kept ones
+
+
+def decode_with_offsets(text, chars=None, spans=False):
+    """Return (decoded, offsets): decode_text's result and where each of its characters came from
+
+    offsets is an array('I') in which offsets[i] is the position in text of
+    decoded[i]; one more entry holds len(text), so a span [i, j) of decoded
+    text maps back to text[offsets[i]:offsets[j - 1] + 1]. With spans, the
+    removed_spans of that map are returned as a third item. Everything is
+    built in one linear pass over the candidates that occur in text (NumPy
+    for long texts when it is installed) and the map takes 4 bytes per
+    character.
+    """
+    from array import array
+
+    global _invisible_table
+    offsets = array('I')
+    if chars is None and text.isascii():
+        offsets.extend(range(len(text) + 1))
+        return (text, offsets, []) if spans else (text, offsets)
+    np = load_numpy() if len(text) >= NUMPY_MIN_LENGTH and offsets.itemsize == 4 else None
+    if np is not None:
+        # A lookup table over every codepoint marks the ones to drop
+        if chars is not None:
+            table = np.zeros(sys.maxunicode + 1, dtype=bool)
+            table[[ord(char) for char in chars]] = True
+        else:
+            if _invisible_table is None:
+                _invisible_table = np.zeros(sys.maxunicode + 1, dtype=bool)
+                _invisible_table[[ord(char) for char in invisible_chars()]] = True
+            table = _invisible_table
+        codepoints = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype="<u4")
+        keep = ~table[codepoints]
+        offsets.frombytes(np.flatnonzero(keep).astype("<u4").tobytes())
+        offsets.append(len(text))
+        decoded = codepoints[keep].tobytes().decode("utf-32-le", "surrogatepass")
+        return (decoded, offsets, removed_spans(offsets)) if spans else (decoded, offsets)
+    present = invisible_chars_in(text, chars)
+    removed = sum(map(text.count, present))
+    if removed > len(text) >> 6:
+        # Densely encoded: one C-level pass marks every removed character
+        # with a 1 byte, and bytes methods do the rest
+        from itertools import compress
+
+        decoded = text
+        for char in present:
+            decoded = decoded.replace(char, '')
+        removed = bytes(map(present.__contains__, text))
+        offsets.extend(compress(range(len(text)), removed.translate(KEEP_MASK)))
+        offsets.append(len(text))
+        if not spans:
+            return decoded, offsets
+        # A kept character right after a removed one is marked; dropping the
+        # removed ones leaves one mark byte per decoded character
+        marks = removed.replace(b'\x01\x00', b'\x01\x02').replace(b'\x01', b'')
+        return decoded, offsets, nonzero_runs(marks)
+    # Sparse: find the few removed characters, then copy whole runs of text
+    # and positions between them. A run after a removed character starts
+    # with a marked one, and marks that touch make one span
+    positions = []
+    for char in present:
+        position = text.find(char)
+        while position != -1:
+            positions.append(position)
+            position = text.find(char, position + 1)
+    positions.sort()
+    positions.append(len(text))
+    pieces = []
+    marked = []
+    start = 0
+    for position in positions:
+        if position > start:
+            if start:
+                index = len(offsets)
+                if marked and marked[-1][1] == index:
+                    marked[-1] = (marked[-1][0], index + 1)
+                else:
+                    marked.append((index, index + 1))
+            pieces.append(text[start:position])
+            offsets.extend(range(start, position))
+        start = position + 1
+    offsets.append(len(text))
+    decoded = "".join(pieces)
+    return (decoded, offsets, marked) if spans else (decoded, offsets)
+
+
+def removed_spans(offsets):
+    """Spans [start, end) of decoded text whose every character had invisible ones removed just before it
+
+    offsets is decode_with_offsets' map. Adjacent marked characters form
+    one span, so fully encoded text collapses into a few long spans.
+    """
+    np = load_numpy() if len(offsets) >= NUMPY_MIN_LENGTH and offsets.itemsize == 4 else None
+    if np is not None:
+        positions = np.frombuffer(offsets, dtype="<u4").astype(np.int64)
+        marked = np.diff(positions[:-1], prepend=-1) > 1
+        edges = np.flatnonzero(np.diff(marked.astype(np.int8), prepend=0, append=0))
+        return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+    from itertools import chain, repeat
+    from operator import gt, sub
+
+    # One byte per decoded character, 1 where its offset skips ahead, built by C iterators
+    return nonzero_runs(bytes(map(gt, map(sub, offsets[:-1], chain((-1,), offsets)), repeat(1))))
+
+
+def nonzero_runs(marks):
+    """(start, end) of every run of nonzero bytes in marks"""
+    import re
+
+    return [match.span() for match in re.finditer(rb"[^\x00]+", marks)]
+
+
+def iter_chunks(f, chunk_size=CHUNK_SIZE):
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_encoded(chunks, single_char=False):
+    """Encode a stream of text chunks, yielding the same output as encode_text
+
+    Full encoding marks every character on its own, so a word cut by a
+    chunk boundary is encoded a piece at a time as it arrives. With
+    single_char the mark goes in the middle of each word, so only then is a
+    word held back until its end is seen.
+    """
+    started = False  # Whether a word was output, so the next one needs a space
+    in_word = False  # Whether the last chunk ended inside a word
+    held = []  # With single_char, the pieces so far of a word that may go on in the next chunk
+    for chunk in chunks:
+        if not chunk:
+            continue
+        words = chunk.split()
+        if in_word and not chunk[0].isspace():
+            # The first word goes on from the previous chunk
+            if single_char:
+                held.append(words.pop(0))
+            else:
+                yield encode_word(words.pop(0))
+        in_word = not chunk[-1].isspace()
+        if held and (words or not in_word):
+            encoded = encode_word(''.join(held), True)
+            yield ' ' + encoded if started else encoded
+            started = True
+            held = []
+        if single_char and in_word and words:
+            held.append(words.pop())
+        if words:
+            encoded = ' '.join(encode_word(word, single_char) for word in words)
+            yield ' ' + encoded if started else encoded
+            started = True
+    if held:
+        encoded = encode_word(''.join(held), True)
+        yield ' ' + encoded if started else encoded
+
+
+def iter_decoded(chunks):
+    for chunk in chunks:
+        yield decode_text(chunk)
+
+
+class Normalizer:
+    """Cleaning pipeline built on decode_text, applied in as few passes over the text as possible
+
+    The steps (see NORMALIZE_STEPS) are: strip the invisible characters
+    decode_text removes, apply Unicode NFKC, turn CRLF, CR and the Unicode
+    line and paragraph separators into LF, and collapse runs of whitespace
+    within a line into one space. ASCII text skips the first two outright,
+    line endings are replaced with str.replace only when present, and the
+    whitespace regex is compiled once and only matches what actually
+    changes. Calling a Normalizer cleans a whole text; stream() cleans a
+    stream of chunks to the same result.
+    """
+
+    def __init__(self, strip=True, nfkc=True, newlines=True, whitespace=True):
+        import re
+
+        self.strip = strip
+        self.nfkc = nfkc
+        self.newlines = newlines
+        # Whitespace other than line breaks: runs of two or more, or any single one that is not a space
+        if not whitespace:
+            self.pattern = None
+        elif newlines:
+            # Line endings are already \n by then
+            self.pattern = re.compile(r"[^\S\n]{2,}|[^\S \n]")
+        else:
+            self.pattern = re.compile(r"[^\S\n\r\x85\u2028\u2029]{2,}|[^\S \n\r\x85\u2028\u2029]")
+
+    @classmethod
+    def from_steps(cls, steps):
+        """A Normalizer doing only the named steps"""
+        unknown = set(steps) - set(NORMALIZE_STEPS)
+        if unknown:
+            raise ValueError("unknown normalization steps: " + ", ".join(sorted(unknown)))
+        return cls(**{step: step in steps for step in NORMALIZE_STEPS})
+
+    def __call__(self, text):
+        is_ascii = text.isascii()
+        if not is_ascii:
+            if self.strip:
+                text = decode_text(text)
+            if self.nfkc:
+                text = unicodedata.normalize("NFKC", text)
+        if self.newlines:
+            if "\r" in text:
+                text = text.replace("\r\n", "\n").replace("\r", "\n")
+            if not is_ascii:
+                for separator in "\x85\u2028\u2029":
+                    if separator in text:
+                        text = text.replace(separator, "\n")
+        if self.pattern is not None:
+            text = self.pattern.sub(" ", text)
+        return text
+
+    def stream(self, chunks):
+        """Yield the cleaned text of a stream of chunks, the same as cleaning their concatenation"""
+        carry = ""
+        for chunk in chunks:
+            text = carry + chunk
+            cut = self.cut(text)
+            carry = text[cut:]
+            if cut:
+                yield self(text[:cut])
+        if carry:
+            yield self(carry)
+
+    def cut(self, text):
+        """Where text can be split without changing how either side is cleaned
+
+        Preferably before a printable ASCII character: it is never stripped,
+        NFKC never composes it with what precedes it, and it ends any
+        whitespace run or CRLF. Other scripts fall back to a character with
+        the same properties, checked one by one. Text without one in the
+        last NORMALIZE_LOOKBACK characters is cut at its end regardless.
+        """
+        stop = max(len(text) - NORMALIZE_LOOKBACK, 0)
+        for i in range(len(text) - 1, stop - 1, -1):
+            if " " < text[i] < "\x7f":
+                return i
+        invisible = invisible_chars() if self.strip else ()
+        composing = composing_chars()
+        for i in range(len(text) - 1, stop - 1, -1):
+            char = text[i]
+            if char in invisible or char in "\x85\u2028\u2029":
+                continue
+            normalized = unicodedata.normalize("NFKC", char)
+            if not normalized or normalized[0].isspace() or unicodedata.combining(normalized[0]):
+                continue
+            # Starters such as Hangul vowel and final jamo compose with what
+            # precedes them, which may be a whole cluster (L V | T)
+            if normalized[0] not in composing:
+                return i
+        # Keep waiting for a safe cut, but not beyond the lookback
+        return len(text) if stop else 0
+
+
+_composing_chars = None
+
+
+def composing_chars():
+    """Return every codepoint that canonical composition can join to the character before it
+
+    These are the second halves of the canonical two-character decompositions
+    plus the Hangul vowel and final jamo, which compose algorithmically: the
+    characters whose NFC quick check is Maybe. Built once, on first use.
+    """
+    global _composing_chars
+    if _composing_chars is None:
+        chars = set(map(chr, range(0x1161, 0x1176)))
+        chars.update(map(chr, range(0x11A8, 0x11C3)))
+        for cp in range(sys.maxunicode + 1):
+            parts = unicodedata.decomposition(chr(cp)).split()
+            if len(parts) == 2 and not parts[0].startswith("<"):
+                chars.add(chr(int(parts[1], 16)))
+        _composing_chars = frozenset(chars)
+    return _composing_chars
+
+
+_invisible_byte_groups = None
+
+
+def invisible_byte_groups():
+    """UTF-8 encodings of invisible_chars() grouped by their first two bytes,
+    plus the bytes that can never start one of them"""
+    global _invisible_byte_groups
+    if _invisible_byte_groups is None:
+        groups = {}
+        for char in invisible_chars():
+            sequence = char.encode("utf-8")
+            groups.setdefault(sequence[:2], []).append(sequence)
+        lead_bytes = {prefix[0] for prefix in groups}
+        other_bytes = bytes(b for b in range(256) if b not in lead_bytes)
+        _invisible_byte_groups = sorted(groups.items()), other_bytes
+    return _invisible_byte_groups
+
+
+def decode_bytes(data):
+    """decode_text for UTF-8 bytes, without ever building a str"""
+    if data.isascii():
+        return data
+    groups, other_bytes = invisible_byte_groups()
+    # One translate() pass keeps only the bytes that can start a candidate, so
+    # most groups are ruled out without searching the data for their prefix
+    leads = data.translate(None, other_bytes)
+    if not leads:
+        return data
+    for prefix, sequences in groups:
+        if prefix[:1] in leads and prefix in data:
+            for sequence in sequences:
+                data = data.replace(sequence, b'')
+    return data
+
+
+class AtomicFile:
+    """Context manager writing path through a temporary file that is renamed into place on success
+
+    Readers see either the previous file or the complete new one, never a
+    partial write; on error the temporary file is removed and any previous
+    file is left alone. The temporary file sits next to path, hidden, with a
+    .tmp suffix. With fsync the data reaches the disk before the rename, and
+    the rename itself before leaving the with block. mode, encoding and
+    newline are open()'s.
+    """
+
+    def __init__(self, path, mode="w", encoding=None, buffering=WRITE_BUFFER_SIZE, fsync=False, newline=None):
+        self.path = path
+        self.mode = mode
+        self.encoding = encoding
+        self.buffering = buffering
+        self.fsync = fsync
+        self.newline = newline
+        self.temp_path = None
+        self.file = None
+
+    def __enter__(self):
+        directory, name = os.path.split(self.path)
+        mode = self.mode.replace("w", "x")
+        for attempt in range(100):
+            # Opened like any other file, so the output gets the usual permissions
+            self.temp_path = os.path.join(directory, f".{name}.{os.getpid()}.{os.urandom(4).hex()}.tmp")
+            try:
+                self.file = open(self.temp_path, mode, buffering=self.buffering, encoding=self.encoding,
+                                 newline=self.newline)
+                break
+            except FileExistsError:
+                continue
+        else:
+            raise FileExistsError(f"no free temporary name for {self.path}")
+        return self.file
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.file.flush()
+                if self.fsync:
+                    os.fsync(self.file.fileno())
+            self.file.close()
+            if exc_type is None:
+                os.replace(self.temp_path, self.path)
+                self.temp_path = None
+                if self.fsync:
+                    sync_directory(os.path.dirname(self.path))
+        finally:
+            if self.temp_path is not None:
+                try:
+                    os.remove(self.temp_path)
+                except OSError:
+                    pass
+
+
+def sync_directory(path):
+    """fsync a directory, making renames in it durable; a no-op where directories can't be opened"""
+    try:
+        fd = os.open(path or os.curdir, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def sync_outputs(paths):
+    """Flush finished outputs to disk at once, for the "batch" fsync mode
+
+    Each file is fsynced, then each folder they were renamed into, once.
+    """
+    # Windows only flushes files opened for writing
+    flags = os.O_RDWR if os.name == "nt" else os.O_RDONLY
+    directories = set()
+    for path in dict.fromkeys(paths):
+        fd = os.open(path, flags)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        directories.add(os.path.dirname(path))
+    for directory in directories:
+        sync_directory(directory)
+
+
+def decode_file_mmap(input_path, output_path, window=MMAP_WINDOW, hasher=None, profile=None, fsync=False):
+    """Decode a UTF-8 file by memory-mapping it and stripping invisible characters as bytes
+
+    Only one window of the input is copied at a time. Line endings and any
+    invalid UTF-8 are passed through untouched. The output is written
+    atomically (see AtomicFile). If given, hasher is updated with the input
+    bytes. Returns the bytes written.
+    """
+    profile = profile or NO_PROFILE
+    written = 0
+    with open(input_path, 'rb') as src, AtomicFile(output_path, 'wb', fsync=fsync) as dst:
+        size = os.fstat(src.fileno()).st_size
+        if not size:
+            return written
+        with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            while start < size:
+                end = min(start + window, size)
+                # Never split a character: back off to the start of a UTF-8 sequence
+                while start < end < size and 0x80 <= mm[end] < 0xC0:
+                    end -= 1
+                if end == start:
+                    # The window is smaller than this character; take it whole
+                    end = start + 1
+                    while end < size and 0x80 <= mm[end] < 0xC0:
+                        end += 1
+                with profile.stage("read", end - start):
+                    data = mm[start:end]
+                    if hasher is not None:
+                        hasher.update(data)
+                with profile.stage("transform", len(data)):
+                    data = decode_bytes(data)
+                with profile.stage("write", len(data)):
+                    dst.write(data)
+                written += len(data)
+                start = end
+    return written
+
+
+_numpy = None
+
+
+def load_numpy():
+    """Import NumPy on first use; return None when it is not installed"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+class EntropyAccumulator:
+    """Character histogram that can be fed text in chunks and merged across processes"""
+
+    def __init__(self, text=""):
+        self.counts = Counter()
+        self.length = 0
+        if text:
+            self.update(text)
+
+    def update(self, chunk):
+        np = load_numpy() if len(chunk) >= NUMPY_MIN_LENGTH else None
+        if np is None:
+            self.counts.update(chunk)
+        else:
+            # View the text as UTF-32 code points and histogram them in one pass
+            counts = np.bincount(np.frombuffer(chunk.encode("utf-32-le", "surrogatepass"), dtype="<u4"))
+            codepoints = np.flatnonzero(counts)
+            for cp, n in zip(codepoints.tolist(), counts[codepoints].tolist()):
+                self.counts[chr(cp)] += n
+        self.length += len(chunk)
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.length += other.length
+        return self
+
+    def remove(self, chunk):
+        """Undo update(chunk)"""
+        removed = EntropyAccumulator(chunk).counts
+        self.counts.subtract(removed)
+        for char in removed:
+            if self.counts[char] <= 0:
+                del self.counts[char]
+        self.length -= len(chunk)
+
+    def entropy(self):
+        if not self.length:
+            return 0
+        probs = [n_x / self.length for n_x in self.counts.values()]
+        # fsum is exact whatever the order, so chunking never changes the rounded result
+        return round(0.0 - math.fsum(p * math.log2(p) for p in probs), 4)
+
+    def invisible(self):
+        """Number of characters decode_text would remove"""
+        invisible = invisible_chars()
+        return sum(n for char, n in self.counts.items() if char in invisible)
+
+
+def calc_entropy(s):
+    return EntropyAccumulator(s).entropy()
+
+
+def compare_statistics(original, modified):
+    """Build the statistics shown to the user from two EntropyAccumulators"""
+    return {
+        "Characters Inserted": modified.invisible() - original.invisible(),
+        "Original Length": original.length,
+        "Modified Length": modified.length,
+        "Entropy Original": original.entropy(),
+        "Entropy Modified": modified.entropy()
+    }
+
+
+def get_text_statistics(original, modified):
+    return compare_statistics(EntropyAccumulator(original), EntropyAccumulator(modified))
+
+
+def common_affix_lengths(old, new):
+    """Lengths of the longest common prefix and suffix of two strings, not overlapping
+
+    Binary searches with slice comparisons, so the strings are compared at C
+    speed in O(n log n) rather than one character at a time.
+    """
+    if old == new:
+        return len(old), 0
+    limit = min(len(old), len(new))
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[:middle] == new[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    prefix = low
+    low, high = 0, limit - prefix
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[len(old) - middle:] == new[len(new) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return prefix, low
+
+
+class IncrementalStatistics:
+    """Statistics of a text being edited, recounting only the region that changed"""
+
+    def __init__(self):
+        self.text = ""
+        self.accumulator = EntropyAccumulator()
+
+    def update(self, text):
+        """Catch up with the new text; return the number of characters recounted"""
+        old = self.text
+        prefix, suffix = common_affix_lengths(old, text)
+        removed = old[prefix:len(old) - suffix]
+        added = text[prefix:len(text) - suffix]
+        if removed:
+            self.accumulator.remove(removed)
+        if added:
+            self.accumulator.update(added)
+        self.text = text
+        return len(removed) + len(added)
+
+    def statistics(self):
+        return {
+            "Length": self.accumulator.length,
+            "Entropy": self.accumulator.entropy(),
+            "Invisible Characters": self.accumulator.invisible(),
+        }
+
+
+def iter_counted(chunks, accumulator, profile=None):
+    profile = profile or NO_PROFILE
+    for chunk in chunks:
+        with profile.stage("statistics", len(chunk)):
+            accumulator.update(chunk)
+        yield chunk
+
+
+def peak_rss():
+    """Peak resident memory of this process in bytes, or None where that is unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class Stage:
+    """One timed run of a profiled stage; size may be set while it runs"""
+
+    def __init__(self, profile, name, size=0):
+        self.profile = profile
+        self.name = name
+        self.size = size
+
+    def __enter__(self):
+        self.profile.enter()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.exit(self.name, time.perf_counter() - self.started, self.size)
+
+
+class Profile:
+    """Wall time, size and peak traced memory per named stage of a job
+
+    Stages may nest, and each is charged only its own time, not that of the
+    stages inside it. Sizes are characters for text and bytes for binary
+    data. Peak memory is only measured with trace_memory, as tracemalloc
+    then runs for as long as the profile is open and makes allocation-heavy
+    code such as the pure-Python statistics several times slower.
+    """
+    enabled = True
+
+    def __init__(self, trace_memory=False):
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.finished = None
+        self.trace_memory = trace_memory
+        self.owns_tracing = False
+        if trace_memory:
+            import tracemalloc
+
+            self.owns_tracing = not tracemalloc.is_tracing()
+            if self.owns_tracing:
+                tracemalloc.start()
+        self.stack = []  # [child seconds, traced bytes at the start, peak traced bytes] per open stage
+
+    def close(self):
+        """Stop the clock (and tracemalloc, if this profile started it)"""
+        if self.finished is None:
+            self.finished = time.perf_counter()
+        if self.owns_tracing:
+            import tracemalloc
+
+            tracemalloc.stop()
+            self.owns_tracing = False
+
+    def stage(self, name, size=0):
+        return Stage(self, name, size)
+
+    def iterate(self, name, iterable):
+        """Yield from iterable, charging the time spent producing each item to stage name"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as stage:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                stage.size = len(item)
+            yield item
+
+    def enter(self):
+        frame = [0.0, 0, 0]
+        if self.trace_memory:
+            import tracemalloc
+
+            if tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                if self.stack:
+                    # The peak is about to be reset; keep the enclosing stage's so far
+                    self.stack[-1][2] = max(self.stack[-1][2], peak)
+                tracemalloc.reset_peak()
+                frame[1] = frame[2] = current
+        self.stack.append(frame)
+
+    def exit(self, name, seconds, size):
+        child_seconds, baseline, peak = self.stack.pop()
+        peak_bytes = None
+        if self.trace_memory:
+            import tracemalloc
+
+            if tracemalloc.is_tracing():
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                peak_bytes = peak - baseline
+        self.add(name, seconds - child_seconds, size, peak_bytes)
+        if self.stack:
+            self.stack[-1][0] += seconds
+            self.stack[-1][2] = max(self.stack[-1][2], peak)
+
+    def add(self, name, seconds, size=0, peak_bytes=None, calls=1):
+        entry = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "size": 0, "peak_bytes": None})
+        entry["calls"] += calls
+        entry["seconds"] += seconds
+        entry["size"] += size
+        if peak_bytes is not None:
+            entry["peak_bytes"] = max(entry["peak_bytes"] or 0, peak_bytes)
+
+    def merge(self, stages):
+        """Add the stages of another profile, e.g. one returned by a worker process"""
+        for name, entry in stages.items():
+            self.add(name, entry["seconds"], entry["size"], entry["peak_bytes"], entry["calls"])
+        return self
+
+    def report(self):
+        """The profile as a JSON-serialisable dict"""
+        return {
+            "wall_seconds": round((self.finished or time.perf_counter()) - self.started, 6),
+            "peak_rss_bytes": peak_rss(),
+            "stages": {name: dict(entry, seconds=round(entry["seconds"], 6))
+                       for name, entry in self.stages.items()},
+        }
+
+    def summary(self):
+        """One line for a status bar"""
+        parts = []
+        for name, entry in self.stages.items():
+            part = f"{name} {entry['seconds'] * 1000:.0f} ms"
+            if entry["peak_bytes"]:
+                part += f" (peak {entry['peak_bytes'] / (1 << 20):.1f} MB)"
+            parts.append(part)
+        return " · ".join(parts)
+
+
+class NullProfile:
+    """Stands in for a Profile when profiling is off; a stage costs one method call"""
+    enabled = False
+
+    def close(self):
+        pass
+
+    def stage(self, name, size=0):
+        return NULL_STAGE
+
+    def iterate(self, name, iterable):
+        return iterable
+
+
+class NullStage:
+    size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_STAGE = NullStage()
+NO_PROFILE = NullProfile()
+
+
+class HashingReader(io.RawIOBase):
+    """Raw binary reader that feeds everything it reads into a hashlib object"""
+
+    def __init__(self, raw, hasher):
+        self.raw = raw
+        self.hasher = hasher
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self.raw.readinto(buffer)
+        if n:
+            self.hasher.update(memoryview(buffer)[:n])
+        return n
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+def open_text(source, hasher=None):
+    """open(source, 'r', encoding='utf-8', newline=''), optionally hashing the raw bytes as they are read
+
+    source may also be the file's contents as bytes, already read. Line
+    endings are read as they are, like decode_file_mmap leaves them.
+    """
+    if isinstance(source, bytes):
+        if hasher is not None:
+            hasher.update(source)
+        return io.TextIOWrapper(io.BytesIO(source), encoding="utf-8", newline="")
+    if hasher is None:
+        return open(source, 'r', encoding="utf-8", newline="")
+    raw = HashingReader(open(source, 'rb', buffering=0), hasher)
+    return io.TextIOWrapper(io.BufferedReader(raw), encoding="utf-8", newline="")
+
+
+def transform_file(operation, input_path, output_path, single_char=False, chunk_size=CHUNK_SIZE, hasher=None,
+                   profile=None, fsync=False):
+    """Stream input_path through encode/decode into output_path with bounded memory
+
+    input_path may also be the input's contents as bytes. The output is
+    written atomically (see AtomicFile). Returns EntropyAccumulators for the
+    input and the output, gathered on the way. If given, hasher is updated
+    with the raw input bytes, and profile with the read, transform,
+    statistics and write stages.
+    """
+    with open_text(input_path, hasher) as src, AtomicFile(output_path, 'w', "utf-8", fsync=fsync, newline="") as dst:
+        return transform_stream(operation, src, dst, single_char, chunk_size, profile)
+
+
+def transform_stream(operation, src, dst, single_char=False, chunk_size=CHUNK_SIZE, profile=None):
+    """Encode or decode text file src into text file dst a chunk at a time; return EntropyAccumulators"""
+    profile = profile or NO_PROFILE
+    input_stats = EntropyAccumulator()
+    output_stats = EntropyAccumulator()
+    chunks = iter_counted(profile.iterate("read", iter_chunks(src, chunk_size)), input_stats, profile)
+    if operation == "encode":
+        transformed = iter_encoded(chunks, single_char)
+    else:
+        transformed = iter_decoded(chunks)
+    transformed = iter_counted(profile.iterate("transform", transformed), output_stats, profile)
+    if profile.enabled:
+        for chunk in transformed:
+            with profile.stage("write", len(chunk)):
+                dst.write(chunk)
+    else:
+        dst.writelines(transformed)
+    return input_stats, output_stats
+
+
+def matches_any(name, relative_path, patterns):
+    """fnmatch name, or the /-separated relative path for patterns containing a /"""
+    import fnmatch
+
+    for pattern in patterns:
+        if fnmatch.fnmatch(relative_path if "/" in pattern else name, pattern):
+            return True
+    return False
+
+
+def iter_files(root, include=("*.txt",), exclude=(), min_size=None, max_size=None, recursive=True):
+    """Yield the path of every matching regular file below root, lazily, using os.scandir
+
+    A file is yielded when its name (or, for patterns containing a /, its path
+    relative to root) matches one of `include` (an empty tuple matches all)
+    and none of `exclude`; directories matching `exclude` are not entered.
+    Sizes are only checked when a limit is given. Unreadable directories are
+    skipped. A root that is a file is yielded as is.
+    """
+    if not os.path.isdir(root):
+        yield root
+        return
+    needs_relative_path = any("/" in pattern for pattern in tuple(include) + tuple(exclude))
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    relative_path = None
+                    if needs_relative_path:
+                        relative_path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                    if exclude and matches_any(entry.name, relative_path, exclude):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    if include and not matches_any(entry.name, relative_path, include):
+                        continue
+                    if min_size is not None or max_size is not None:
+                        size = entry.stat().st_size
+                        if (min_size is not None and size < min_size) or \
+                                (max_size is not None and size > max_size):
+                            continue
+                    yield entry.path
+                except OSError:
+                    continue
+
+
+def scan_file(path, chunk_size=CHUNK_SIZE):
+    """Count the characters and invisible characters in one file, streaming it"""
+    result = {"path": path, "size": 0, "chars": 0, "invisible": 0, "density": 0.0, "error": ""}
+    try:
+        result["size"] = os.path.getsize(path)
+        with open(path, 'r', encoding="utf-8") as f:
+            for chunk in iter_chunks(f, chunk_size):
+                result["chars"] += len(chunk)
+                result["invisible"] += len(chunk) - len(decode_text(chunk))
+    except (OSError, UnicodeDecodeError) as e:
+        result["error"] = str(e)
+    if result["chars"]:
+        result["density"] = result["invisible"] / result["chars"]
+    return result
+
+
+def scan_files(paths):
+    return [scan_file(path) for path in paths]
+
+
+def scan_tree(roots, workers=None, batch_size=64, **walk_options):
+    """Yield scan_file results for every file below roots, scanned by a process pool
+
+    walk_options are passed on to iter_files. Paths are sent to the workers in batches as the walk finds them, and only
+    a few batches per worker are in flight at once, so memory stays flat on
+    trees of any size. Results arrive in completion order.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        batch = []
+        for root in roots:
+            for path in iter_files(root, **walk_options):
+                batch.append(path)
+                if len(batch) < batch_size:
+                    continue
+                pending.add(pool.submit(scan_files, batch))
+                batch = []
+                if len(pending) >= workers * 4:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
+        if batch:
+            pending.add(pool.submit(scan_files, batch))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
@@ -1,44 +1,40 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
+import json
 import os
-import pyperclip
-import math
-from collections import Counter
+import queue
+import threading
 
-ZERO_WIDTH_CHAR = "\u200E"
+from ghostwriter_batch import BatchJob, archive_format, journal_path_for, read_journal
+from ghostwriter_core import (
+    NO_PROFILE,
+    EntropyAccumulator,
+    IncrementalStatistics,
+    Profile,
+    compare_statistics,
+    decode_text,
+    encode_text,
+    get_text_statistics,
+)
 
+OUTPUT_INSERT_CHUNK = 1 << 16  # Characters inserted into the output Text widget per event-loop turn
+BATCH_FSYNC = "none"  # "file" to flush each batch output to disk before it appears, "batch" to flush all at the end
+ARCHIVE_FILETYPES = [("Archives", "*.zip *.tar *.tar.gz *.tgz *.tar.bz2 *.tar.xz")]
+LIVE_STATS_DELAY = 300  # Milliseconds of typing pause before the live statistics update
+LIVE_STATS_SYNC_LIMIT = 1 << 17  # Longer inputs have their live statistics updated on a worker thread
+CLIPBOARD_CHUNK = 1 << 20  # Characters appended to Tk's clipboard per event-loop turn
+CLIPBOARD_CONFIRM_SIZE = 16 << 20  # Auto-copy asks before copying outputs longer than this many characters
 
-def encode_text(text, single_char=False):
-    mod_words = []
-    for word in text.split():
-        if single_char:
-            middle = len(word) // 2
-            mod_word = word[:middle] + ZERO_WIDTH_CHAR + word[middle:]
-        else:
-            mod_word = ''.join(char + ZERO_WIDTH_CHAR for char in word)
-        mod_words.append(mod_word)
-    return ' '.join(mod_words)
-
-
-def decode_text(text):
-    return text.replace(ZERO_WIDTH_CHAR, '')
-
-
-def calc_entropy(s):
-    prob = [n_x / len(s) for x, n_x in Counter(s).items()]
-    entropy = -sum([p * math.log2(p) for p in prob])
-    return round(entropy, 4)
+_pyperclip = None
 
 
-def get_text_statistics(original, modified):
-    inserted = modified.count(ZERO_WIDTH_CHAR)
-    return {
-        "Characters Inserted": inserted,
-        "Original Length": len(original),
-        "Modified Length": len(modified),
-        "Entropy Original": calc_entropy(original),
-        "Entropy Modified": calc_entropy(modified)
-    }
+def copy_text(text):
+    """Copy text with pyperclip, imported on first use"""
+    global _pyperclip
+    if _pyperclip is None:
+        import pyperclip
+        _pyperclip = pyperclip
+    _pyperclip.copy(text)
 
 
 class GhostWriterApp:
@@ -51,6 +47,28 @@ class GhostWriterApp:
         self.is_dark_mode = tk.BooleanVar(value=True)
         self.auto_copy_enabled = tk.BooleanVar(value=True)
         self.enter_key_enabled = tk.BooleanVar(value=True)  # New toggle for Enter key
+        self.live_stats_enabled = tk.BooleanVar(value=False)
+        self.profiling_enabled = tk.BooleanVar(value=False)
+        self.trace_memory_enabled = tk.BooleanVar(value=False)
+        self.last_profile = None
+        
+        # Background transform state: results of superseded jobs are dropped,
+        # and the output being inserted chunk by chunk is kept in full here
+        self.job_id = 0
+        self.pending_output = None
+        self.status_after_id = None
+        
+        # Clipboard state: copies go through Tk unless it fails, and a newer
+        # copy supersedes one still being appended
+        self.copy_id = 0
+        self.tk_clipboard = True
+        self.tk_clipboard_text = None
+        
+        # Live statistics of the input, kept up to date while typing
+        self.live_stats = None
+        self.live_stats_after_id = None
+        self.live_stats_busy = False
+        self.live_stats_dirty = False
         
         # Define color schemes
         self.themes = {
@@ -58,18 +76,21 @@ class GhostWriterApp:
                 'bg': '#1e1e1e',
                 'text_bg': '#2e2e2e',
                 'text_fg': 'white',
-                'label_fg': '#c0c0c0'
+                'label_fg': '#c0c0c0',
+                'highlight_bg': '#5c4b12'
             },
             'light': {
                 'bg': '#f0f0f0',
                 'text_bg': 'white',
                 'text_fg': 'black',
-                'label_fg': '#333333'
+                'label_fg': '#333333',
+                'highlight_bg': '#ffe59a'
             }
         }
         
         self.apply_theme()
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
     def apply_theme(self):
         """Apply the current theme to the root window"""
@@ -118,6 +139,17 @@ class GhostWriterApp:
         )
         enter_toggle.pack(side="left")
         
+        live_label = tk.Label(enter_frame, text="Statistics:", font=('Segoe UI', 10))
+        live_label.pack(side="left", padx=(20, 5))
+        live_toggle = tk.Checkbutton(
+            enter_frame,
+            text="Live",
+            variable=self.live_stats_enabled,
+            command=self.toggle_live_stats,
+            font=('Segoe UI', 10)
+        )
+        live_toggle.pack(side="left")
+        
         # Auto-copy toggle
         copy_frame = tk.Frame(settings_frame)
         copy_frame.pack(side="right")
@@ -130,6 +162,29 @@ class GhostWriterApp:
             font=('Segoe UI', 10)
         )
         copy_toggle.pack(side="left")
+        
+        # Profiling toggles
+        profile_frame = tk.Frame(settings_frame)
+        profile_frame.pack(side="right", padx=(0, 20))
+        
+        tk.Label(profile_frame, text="Profiling:", font=('Segoe UI', 10)).pack(side="left", padx=(0, 5))
+        profile_toggle = tk.Checkbutton(
+            profile_frame,
+            text="Enable",
+            variable=self.profiling_enabled,
+            command=self.toggle_profiling,
+            font=('Segoe UI', 10)
+        )
+        profile_toggle.pack(side="left")
+        memory_toggle = tk.Checkbutton(
+            profile_frame,
+            text="Memory",
+            variable=self.trace_memory_enabled,
+            state="disabled",
+            font=('Segoe UI', 10)
+        )
+        memory_toggle.pack(side="left")
+        self.memory_toggle = memory_toggle
 
         # Input text area
         self.input_text = tk.Text(self.root, height=10, wrap="word")
@@ -147,6 +202,7 @@ class GhostWriterApp:
         ttk.Button(button_frame, text="Copy to Clipboard", command=self.copy_to_clipboard).pack(side="left", padx=5)
         ttk.Button(button_frame, text="Batch Mode", command=self.batch_mode).pack(side="left", padx=5)
         ttk.Button(button_frame, text="Clear", command=self.clear_fields).pack(side="left", padx=5)
+        self.save_profile_button = ttk.Button(button_frame, text="Save Profile", command=self.save_profile)
 
         # Output text area
         self.output_text = tk.Text(self.root, height=10, wrap="word")
@@ -162,9 +218,12 @@ class GhostWriterApp:
         
         # Store references to themed widgets for updates
         self.themed_widgets = {
-            'frames': [settings_frame, theme_frame, center_frame, enter_frame, copy_frame, button_frame],
-            'labels': [theme_frame.winfo_children()[0], enter_frame.winfo_children()[0], copy_frame.winfo_children()[0]],
-            'checkbuttons': [theme_frame.winfo_children()[1], enter_frame.winfo_children()[1], copy_frame.winfo_children()[1]],
+            'frames': [settings_frame, theme_frame, center_frame, enter_frame, copy_frame, profile_frame,
+                       button_frame],
+            'labels': [theme_frame.winfo_children()[0], enter_frame.winfo_children()[0], copy_frame.winfo_children()[0],
+                       profile_frame.winfo_children()[0], live_label],
+            'checkbuttons': [theme_frame.winfo_children()[1], enter_frame.winfo_children()[1], copy_frame.winfo_children()[1],
+                             profile_toggle, memory_toggle, live_toggle],
             'texts': [self.input_text, self.output_text],
             'stats_label': self.stats_text,
             'status_label': self.status_text
@@ -179,6 +238,8 @@ class GhostWriterApp:
         self.input_text.bind('<Return>', self.on_enter_key)
         # Bind Shift+Return for line breaks when enter key is enabled
         self.input_text.bind('<Shift-Return>', self.on_shift_enter)
+        # Any change to the input, typed or pasted, for the live statistics
+        self.input_text.bind('<<Modified>>', self.on_input_modified)
 
     def on_enter_key(self, event):
         """Handle Enter key press in input text"""
@@ -207,6 +268,108 @@ class GhostWriterApp:
         else:
             self.show_status_message("✓ Enter key auto-encode disabled (Enter for line breaks)")
 
+    def toggle_live_stats(self):
+        """Start or stop updating the statistics while typing"""
+        if self.live_stats_after_id is not None:
+            self.root.after_cancel(self.live_stats_after_id)
+            self.live_stats_after_id = None
+        if self.live_stats_enabled.get():
+            self.update_live_stats()
+            self.show_status_message("✓ Live statistics enabled")
+        else:
+            self.live_stats = None
+            self.stats_text.config(text="")
+            self.show_status_message("✓ Live statistics disabled")
+
+    def on_input_modified(self, event=None):
+        """Debounce input changes: the statistics update once typing pauses"""
+        # Tk only fires <<Modified>> again after the flag has been reset
+        self.input_text.edit_modified(False)
+        if not self.live_stats_enabled.get():
+            return
+        if self.live_stats_after_id is not None:
+            self.root.after_cancel(self.live_stats_after_id)
+        self.live_stats_after_id = self.root.after(LIVE_STATS_DELAY, self.update_live_stats)
+
+    def update_live_stats(self):
+        """Recount the edited region of the input, on a worker thread for long inputs"""
+        self.live_stats_after_id = None
+        if not self.live_stats_enabled.get():
+            return
+        if self.live_stats_busy:
+            # A worker is still counting; go again once it is done
+            self.live_stats_dirty = True
+            return
+        text = self.input_text.get("1.0", "end-1c")
+        if self.live_stats is not None and len(text) <= LIVE_STATS_SYNC_LIMIT:
+            self.live_stats.update(text)
+            self.stats_text.config(text=self.format_stats(self.live_stats.statistics()))
+            return
+        
+        # The first count also builds the invisible character table, so it always runs in the background
+        if self.live_stats is None:
+            self.live_stats = IncrementalStatistics()
+        live_stats = self.live_stats
+        self.live_stats_busy = True
+        
+        def work():
+            live_stats.update(text)
+            return live_stats.statistics()
+        
+        def done(ok, value):
+            self.live_stats_busy = False
+            if not ok:
+                # Start over from scratch rather than trust half-applied counts
+                self.live_stats = None
+            elif live_stats is self.live_stats and self.live_stats_enabled.get():
+                self.stats_text.config(text=self.format_stats(value))
+            if self.live_stats_dirty:
+                self.live_stats_dirty = False
+                self.update_live_stats()
+        
+        self.run_in_background(work, done)
+
+    def toggle_profiling(self):
+        """Show or hide the profiling controls"""
+        if self.profiling_enabled.get():
+            self.memory_toggle.config(state="normal")
+            self.save_profile_button.pack(side="left", padx=5)
+            self.show_status_message("✓ Profiling enabled: stage timings are shown after each action")
+        else:
+            self.memory_toggle.config(state="disabled")
+            self.save_profile_button.pack_forget()
+            self.show_status_message("✓ Profiling disabled")
+
+    def new_profile(self):
+        """A Profile for the next action, or NO_PROFILE when profiling is off"""
+        if self.profiling_enabled.get():
+            return Profile(trace_memory=self.trace_memory_enabled.get())
+        return NO_PROFILE
+
+    def show_profile(self, profile):
+        """Keep a finished profile for saving and show its summary in the status bar"""
+        if not profile.enabled:
+            return
+        profile.close()
+        self.last_profile = profile
+        self.show_status_message(f"⏱ {profile.summary()}", duration=15000)
+
+    def save_profile(self):
+        if self.last_profile is None:
+            messagebox.showinfo("No Profile", "Run an action with profiling enabled first.")
+            return
+        path = filedialog.asksaveasfilename(title="Save profile", defaultextension=".json",
+                                            filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.last_profile.report(), f, indent=1)
+        except OSError as e:
+            messagebox.showerror("Save Failed", f"Could not save the profile:\n{e}")
+            return
+        self.show_status_message(f"✓ Profile saved to {path}")
+
     def update_ttk_style(self):
         """Update ttk widget styles based on current theme"""
         if self.is_dark_mode.get():
@@ -245,6 +408,8 @@ class GhostWriterApp:
         for text_widget in self.themed_widgets['texts']:
             text_widget.configure(bg=colors['text_bg'], fg=colors['text_fg'],
                                 insertbackground=colors['text_fg'])
+        # Marks where decoding removed invisible characters
+        self.output_text.tag_configure("removed", background=colors['highlight_bg'])
         
         # Update stats label
         self.themed_widgets['stats_label'].configure(bg=colors['bg'], fg=colors['label_fg'])
@@ -261,56 +426,270 @@ class GhostWriterApp:
     def show_status_message(self, message, duration=2000):
         """Show a temporary status message"""
         self.status_text.config(text=message)
-        # Clear the message after specified duration
-        self.root.after(duration, lambda: self.status_text.config(text=""))
+        # Clear the message after specified duration, unless a newer one replaced it
+        if self.status_after_id is not None:
+            self.root.after_cancel(self.status_after_id)
+        self.status_after_id = self.root.after(duration, self.clear_status_message)
+
+    def clear_status_message(self):
+        self.status_after_id = None
+        self.status_text.config(text="")
 
-    def auto_copy_if_enabled(self, content):
+    def auto_copy_if_enabled(self, content, profile=NO_PROFILE):
         """Automatically copy content to clipboard if auto-copy is enabled"""
-        if self.auto_copy_enabled.get() and content:
-            pyperclip.copy(content)
-            # Show status message instead of popup
-            self.show_status_message("✓ Output automatically copied to clipboard")
+        if not self.auto_copy_enabled.get() or not content:
+            return
+        if len(content) > CLIPBOARD_CONFIRM_SIZE and not messagebox.askyesno(
+                "Copy Large Output", f"The output is {len(content):,} characters long. Copy it to the clipboard?"):
+            return
+        # Show status message instead of popup
+        self.copy_in_background(content, "✓ Output automatically copied to clipboard", profile)
+    
+    def copy_in_background(self, text, message, profile=NO_PROFILE):
+        """Copy text to the clipboard without blocking the window, then show message
+        
+        Tk's own clipboard is served by this process, so no xclip or xsel is
+        started per copy; long texts are appended to it a chunk per
+        event-loop turn. Only when Tk cannot take it does pyperclip copy,
+        on a worker thread.
+        """
+        self.copy_id += 1
+        copy = self.copy_id
+        if self.tk_clipboard:
+            try:
+                with profile.stage("copy", min(len(text), CLIPBOARD_CHUNK)):
+                    self.root.clipboard_clear()
+                    self.root.clipboard_append(text[:CLIPBOARD_CHUNK])
+            except tk.TclError:
+                self.tk_clipboard = False
+            else:
+                self.tk_clipboard_text = text
+                self.append_to_clipboard(text, CLIPBOARD_CHUNK, copy, message, profile)
+                return
+        self.tk_clipboard_text = None
+        
+        def done(ok, value):
+            if copy != self.copy_id:
+                return
+            if ok:
+                self.show_status_message(message)
+            else:
+                self.show_status_message(f"✗ Could not copy to the clipboard: {value}", duration=5000)
+        
+        self.run_in_background(lambda: copy_text(text), done)
+    
+    def append_to_clipboard(self, text, position, copy, message, profile=NO_PROFILE):
+        if copy != self.copy_id:
+            return
+        if position >= len(text):
+            self.show_status_message(message)
+            return
+        with profile.stage("copy", min(len(text) - position, CLIPBOARD_CHUNK)):
+            self.root.clipboard_append(text[position:position + CLIPBOARD_CHUNK])
+        self.root.after(1, self.append_to_clipboard, text, position + CLIPBOARD_CHUNK, copy, message, profile)
+    
+    def close(self):
+        """Close the window, first handing a clipboard Tk owns to pyperclip on X11
+        
+        X11 clipboards live in the program that set them, so without this the
+        last copy would be gone once the window is.
+        """
+        text = self.tk_clipboard_text
+        if text is not None and self.root.tk.call("tk", "windowingsystem") == "x11":
+            try:
+                copy_text(text)
+            except Exception:
+                pass  # Without pyperclip or xclip the copy ends with the window, as it would anyway
+        self.root.destroy()
+
+    def run_in_background(self, work, on_done):
+        """Run work() on a worker thread and hand its result to on_done(ok, value) on the Tk thread"""
+        results = queue.Queue()
+        
+        def target():
+            try:
+                results.put((True, work()))
+            except Exception as e:
+                results.put((False, e))
+        
+        def poll():
+            try:
+                ok, value = results.get_nowait()
+            except queue.Empty:
+                self.root.after(20, poll)
+                return
+            on_done(ok, value)
+        
+        threading.Thread(target=target, daemon=True).start()
+        self.root.after(20, poll)
+
+    def start_job(self):
+        """Invalidate any running transform or output insertion and return the new job id"""
+        self.job_id += 1
+        self.pending_output = None
+        return self.job_id
+
+    def get_output(self):
+        """Full output text, including the part that is still being inserted"""
+        if self.pending_output is not None:
+            return self.pending_output.strip()
+        return self.output_text.get("1.0", "end").strip()
+
+    def set_output(self, text, job, profile=NO_PROFILE, spans=()):
+        """Replace the output in chunks so Tk never lays out one enormous insert
+        
+        The characters in spans, (start, end) pairs as removed_spans returns,
+        are highlighted. Tags go in with the text, so no index is ever counted.
+        """
+        with profile.stage("write"):
+            self.output_text.delete("1.0", "end")
+        self.pending_output = text
+        next_span = 0
+        
+        def segments(start, end):
+            # text[start:end] as alternating text and tags arguments for insert()
+            nonlocal next_span
+            pieces = []
+            while start < end:
+                if next_span < len(spans) and spans[next_span][0] <= start:
+                    stop = min(spans[next_span][1], end)
+                    pieces += [text[start:stop], ("removed",)]
+                    if spans[next_span][1] <= end:
+                        next_span += 1
+                else:
+                    stop = min(spans[next_span][0], end) if next_span < len(spans) else end
+                    pieces += [text[start:stop], ()]
+                start = stop
+            return pieces or [""]
+        
+        def insert_from(position):
+            if job != self.job_id:
+                profile.close()
+                return
+            end = min(position + OUTPUT_INSERT_CHUNK, len(text))
+            with profile.stage("write", end - position):
+                self.output_text.insert("end-1c", *segments(position, end))
+            position += OUTPUT_INSERT_CHUNK
+            if position < len(text):
+                self.root.after(1, insert_from, position)
+            else:
+                self.pending_output = None
+                self.show_profile(profile)
+        
+        insert_from(0)
+
+    def transform_action(self, raw, transform, reverse_stats, label, profile=NO_PROFILE, highlight=False):
+        """Run transform(raw) and the statistics off the Tk thread, then show the result
+        
+        With highlight, transform(raw, offsets=True, spans=True) must also
+        return the offset map and removed spans of decode_with_offsets, and
+        the output shows where characters were removed.
+        """
+        job = self.start_job()
+        self.show_status_message(f"{label}...", duration=60000)
+        
+        def work():
+            spans = ()
+            with profile.stage("transform", len(raw)):
+                if highlight:
+                    result, offsets, spans = transform(raw, offsets=True, spans=True)
+                    del offsets
+                else:
+                    result = transform(raw)
+            with profile.stage("statistics", len(raw) + len(result)):
+                if reverse_stats:
+                    return result, get_text_statistics(result, raw), spans
+                return result, get_text_statistics(raw, result), spans
+        
+        def done(ok, value):
+            if job != self.job_id or not ok:
+                profile.close()
+            if job != self.job_id:
+                return
+            if not ok:
+                self.clear_status_message()
+                messagebox.showerror(f"{label} failed", str(value))
+                return
+            result, stats, spans = value
+            self.clear_status_message()
+            self.stats_text.config(text=self.format_stats(stats))
+            
+            # Auto-copy if enabled
+            self.auto_copy_if_enabled(result, profile)
+            self.set_output(result, job, profile, spans)
+        
+        self.run_in_background(work, done)
 
     def encode_action(self):
-        raw = self.input_text.get("1.0", "end").strip()
+        profile = self.new_profile()
+        with profile.stage("read") as stage:
+            raw = self.input_text.get("1.0", "end").strip()
+            stage.size = len(raw)
         if not raw:
+            profile.close()
             messagebox.showwarning("Input missing", "Please enter some text to encode.")
             return
-        result = encode_text(raw)
-        self.output_text.delete("1.0", "end")
-        self.output_text.insert("1.0", result)
-        self.display_stats(raw, result)
-        
-        # Auto-copy if enabled
-        self.auto_copy_if_enabled(result)
+        self.transform_action(raw, encode_text, False, "Encoding", profile)
 
     def decode_action(self):
-        raw = self.output_text.get("1.0", "end").strip()
+        profile = self.new_profile()
+        with profile.stage("read") as stage:
+            raw = self.get_output()
+            stage.size = len(raw)
         if not raw:
+            profile.close()
             messagebox.showwarning("Output empty", "There is nothing to decode.")
             return
-        decoded = decode_text(raw)
-        self.output_text.delete("1.0", "end")
-        self.output_text.insert("1.0", decoded)
-        self.display_stats(decoded, raw)  # reversing the order to reflect decoding
-        
-        # Auto-copy if enabled
-        self.auto_copy_if_enabled(decoded)
+        # Statistics are reversed to reflect decoding, and the output shows
+        # where invisible characters were removed
+        self.transform_action(raw, decode_text, True, "Decoding", profile, highlight=True)
 
     def copy_to_clipboard(self):
-        content = self.output_text.get("1.0", "end").strip()
+        profile = self.new_profile()
+        with profile.stage("read") as stage:
+            content = self.get_output()
+            stage.size = len(content)
         if content:
-            pyperclip.copy(content)
-            self.show_status_message("✓ Text copied to clipboard")
+            self.copy_in_background(content, "✓ Text copied to clipboard", profile)
+            self.show_profile(profile)
         else:
+            profile.close()
             messagebox.showwarning("Nothing to copy", "Output area is empty.")
 
     def clear_fields(self):
+        self.start_job()
         self.input_text.delete("1.0", "end")
         self.output_text.delete("1.0", "end")
         self.stats_text.config(text="")
 
+    def batch_output_dir(self, operation):
+        # Output folders live next to the script
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        if operation == "encode":
+            return os.path.join(script_dir, "Encoded Output")
+        return os.path.join(script_dir, "Decoded Output")
+
+    def offer_resume(self):
+        """Offer to resume a batch job that was cancelled or interrupted; return True if resumed"""
+        for operation in ("encode", "decode"):
+            job = read_journal(journal_path_for(self.batch_output_dir(operation)))
+            if job is None or job["start"]["operation"] != operation:
+                continue
+            start = job["start"]
+            source = start["root"] if start["root"] else f"{len(start['inputs'])} selected files"
+            how = "was cancelled" if job["end"] == "cancelled" else "was interrupted"
+            message = (f"A batch {operation} of {source} {how} after {len(job['done'])} files.\n\n"
+                       "Resume it now? Files already done are skipped.")
+            if messagebox.askyesno("Resume Batch", message):
+                self.execute_batch_operation(operation, start["inputs"], start["root"], start["walk"],
+                                             resume=True)
+                return True
+        return False
+
     def batch_mode(self):
+        if self.offer_resume():
+            return
+        
         # Create a dialog to choose operation type
         batch_window = tk.Toplevel(self.root)
         batch_window.title("Batch Mode Options")
@@ -353,6 +732,10 @@ class GhostWriterApp:
                       font=('Segoe UI', 10), bg=colors['bg'], fg=colors['label_fg'],
                       selectcolor=colors['text_bg'], activebackground=colors['bg']).pack(pady=2, anchor="w")
         
+        tk.Radiobutton(main_frame, text="Select Archive (zip/tar)", variable=input_var, value="archive",
+                      font=('Segoe UI', 10), bg=colors['bg'], fg=colors['label_fg'],
+                      selectcolor=colors['text_bg'], activebackground=colors['bg']).pack(pady=2, anchor="w")
+        
         # File selection area
         file_frame = tk.Frame(main_frame, bg=colors['bg'])
         file_frame.pack(fill="x", pady=(20, 0))
@@ -373,12 +756,20 @@ class GhostWriterApp:
         files_listbox.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
-        # Store selected files
+        # Store selected files, or the selected folder or archive whose files are found while processing
         selected_files = []
+        selected_folder = None
+        selected_archive = None
         
         def update_file_display():
             files_listbox.delete(0, tk.END)
-            if selected_files:
+            if selected_folder:
+                files_listbox.insert(tk.END, f"Folder: {selected_folder}")
+                files_listbox.insert(tk.END, "(matching files are found while processing)")
+            elif selected_archive:
+                files_listbox.insert(tk.END, f"Archive: {selected_archive}")
+                files_listbox.insert(tk.END, "(matching members are read while processing)")
+            elif selected_files:
                 for file_path in selected_files:
                     filename = os.path.basename(file_path)
                     files_listbox.insert(tk.END, filename)
@@ -386,7 +777,7 @@ class GhostWriterApp:
                 files_listbox.insert(tk.END, "No files selected")
         
         def select_files():
-            nonlocal selected_files
+            nonlocal selected_files, selected_folder, selected_archive
             if input_var.get() == "files":
                 # Select multiple files
                 file_paths = filedialog.askopenfilenames(
@@ -396,6 +787,17 @@ class GhostWriterApp:
                 )
                 if file_paths:  # Only update if files were selected (not cancelled)
                     selected_files = list(file_paths)
+                    selected_folder = selected_archive = None
+            elif input_var.get() == "archive":
+                archive = filedialog.askopenfilename(
+                    title=f"Select archive of files to {operation_var.get()}",
+                    filetypes=ARCHIVE_FILETYPES + [("All files", "*.*")],
+                    parent=batch_window
+                )
+                if archive:
+                    selected_archive = archive
+                    selected_files = []
+                    selected_folder = None
             else:
                 # Select folder
                 folder = filedialog.askdirectory(
@@ -403,16 +805,60 @@ class GhostWriterApp:
                     parent=batch_window
                 )
                 if folder:  # Only update if folder was selected (not cancelled)
+                    selected_folder = folder
                     selected_files = []
-                    for filename in os.listdir(folder):
-                        if filename.endswith(".txt"):
-                            selected_files.append(os.path.join(folder, filename))
+                    selected_archive = None
             
             update_file_display()
         
         # Select files button
         ttk.Button(file_frame, text="Browse Files", command=select_files).pack(pady=(0, 10))
         
+        # Folder filters
+        filter_frame = tk.Frame(file_frame, bg=colors['bg'])
+        filter_frame.pack(fill="x")
+        
+        recursive_var = tk.BooleanVar(value=True)
+        include_var = tk.StringVar(value="*.txt")
+        exclude_var = tk.StringVar(value="")
+        max_size_var = tk.StringVar(value="")
+        
+        tk.Checkbutton(filter_frame, text="Include subfolders", variable=recursive_var,
+                       font=('Segoe UI', 9), bg=colors['bg'], fg=colors['label_fg'],
+                       selectcolor=colors['text_bg'], activebackground=colors['bg']).grid(
+            row=0, column=0, columnspan=2, sticky="w")
+        for row, (label, variable) in enumerate([("Include patterns:", include_var),
+                                                  ("Exclude patterns:", exclude_var),
+                                                  ("Max size (MB):", max_size_var)], start=1):
+            tk.Label(filter_frame, text=label, font=('Segoe UI', 9),
+                     bg=colors['bg'], fg=colors['label_fg']).grid(row=row, column=0, sticky="w")
+            tk.Entry(filter_frame, textvariable=variable, font=('Segoe UI', 9), bg=colors['text_bg'],
+                     fg=colors['text_fg'], insertbackground=colors['text_fg']).grid(
+                row=row, column=1, sticky="ew", padx=(5, 0), pady=1)
+        filter_frame.columnconfigure(1, weight=1)
+        
+        # Output selection
+        output_frame = tk.Frame(main_frame, bg=colors['bg'])
+        output_frame.pack(fill="x", pady=(10, 0))
+        
+        output_var = tk.StringVar(value="folder")
+        compression_var = tk.StringVar(value="")
+        
+        tk.Label(output_frame, text="Output:", font=('Segoe UI', 10, 'bold'),
+                 bg=colors['bg'], fg=colors['label_fg']).grid(row=0, column=0, columnspan=2, sticky="w")
+        tk.Radiobutton(output_frame, text="Files in output folder", variable=output_var, value="folder",
+                       font=('Segoe UI', 9), bg=colors['bg'], fg=colors['label_fg'],
+                       selectcolor=colors['text_bg'], activebackground=colors['bg']).grid(row=1, column=0, sticky="w")
+        tk.Radiobutton(output_frame, text="One archive (zip/tar)", variable=output_var, value="archive",
+                       font=('Segoe UI', 9), bg=colors['bg'], fg=colors['label_fg'],
+                       selectcolor=colors['text_bg'], activebackground=colors['bg']).grid(row=1, column=1, sticky="w")
+        tk.Label(output_frame, text="Compression (0-9):", font=('Segoe UI', 9),
+                 bg=colors['bg'], fg=colors['label_fg']).grid(row=2, column=0, sticky="w")
+        tk.Entry(output_frame, textvariable=compression_var, font=('Segoe UI', 9), bg=colors['text_bg'],
+                 fg=colors['text_fg'], insertbackground=colors['text_fg']).grid(
+            row=2, column=1, sticky="ew", padx=(5, 0), pady=1)
+        output_frame.columnconfigure(1, weight=1)
+        
         # Initialize display
         update_file_display()
         
@@ -421,12 +867,52 @@ class GhostWriterApp:
         button_frame.pack(pady=(10, 0))
         
         def start_batch():
-            if not selected_files:
+            if not selected_files and not selected_folder and not selected_archive:
                 messagebox.showwarning("No Files Selected", "Please select files before starting batch processing.", parent=batch_window)
                 return
             
+            walk = None
+            if selected_folder or selected_archive:
+                try:
+                    max_size = max_size_var.get().strip()
+                    max_size = int(float(max_size) * 1024 * 1024) if max_size else None
+                except ValueError:
+                    messagebox.showwarning("Invalid Size", "Max size must be a number of megabytes.", parent=batch_window)
+                    return
+                patterns = lambda text: [p.strip() for p in text.split(",") if p.strip()]
+                walk = {"include": patterns(include_var.get()), "exclude": patterns(exclude_var.get()),
+                        "max_size": max_size, "recursive": recursive_var.get()}
+            
+            archive_output = compression_level = None
+            if output_var.get() == "archive":
+                level = compression_var.get().strip()
+                if level and not (level.isdigit() and int(level) <= 9):
+                    messagebox.showwarning("Invalid Compression", "Compression must be a level from 0 to 9, "
+                                           "or empty for the default.", parent=batch_window)
+                    return
+                compression_level = int(level) if level else None
+                archive_output = filedialog.asksaveasfilename(
+                    title="Save results as archive",
+                    defaultextension=".zip",
+                    filetypes=[("Zip archive", "*.zip"), ("Gzipped tar", "*.tar.gz"),
+                               ("Xz tar", "*.tar.xz"), ("Tar", "*.tar")],
+                    parent=batch_window
+                )
+                if not archive_output:
+                    return
+                if archive_format(archive_output) is None:
+                    archive_output += ".zip"
+            
             batch_window.destroy()
-            self.execute_batch_operation(operation_var.get(), selected_files)
+            if selected_folder:
+                self.execute_batch_operation(operation_var.get(), root=selected_folder, walk=walk,
+                                             archive_output=archive_output, compression_level=compression_level)
+            elif selected_archive:
+                self.execute_batch_operation(operation_var.get(), walk=walk, archive_input=selected_archive,
+                                             archive_output=archive_output, compression_level=compression_level)
+            else:
+                self.execute_batch_operation(operation_var.get(), selected_files,
+                                             archive_output=archive_output, compression_level=compression_level)
         
         ttk.Button(button_frame, text="Start Processing", command=start_batch).pack(side="left", padx=10)
         ttk.Button(button_frame, text="Cancel", command=batch_window.destroy).pack(side="left", padx=10)
@@ -434,79 +920,193 @@ class GhostWriterApp:
         # Set proper window size after all widgets are created
         batch_window.update_idletasks()  # Ensure all widgets are rendered
         width = 450
-        height = 480
+        height = 720
         x = self.root.winfo_rootx() + (self.root.winfo_width() // 2) - (width // 2)
         y = self.root.winfo_rooty() + (self.root.winfo_height() // 2) - (height // 2)
         batch_window.geometry(f"{width}x{height}+{x}+{y}")
 
-    def execute_batch_operation(self, operation, selected_files):
-        # Get script directory for output folders
-        script_dir = os.path.dirname(os.path.abspath(__file__))
+    def execute_batch_operation(self, operation, inputs=None, root=None, walk=None, resume=False,
+                                archive_input=None, archive_output=None, compression_level=None):
+        """Run a BatchJob over a list of inputs, the files below root or the members of archive_input
+
+        The job runs on a background thread and this window only shows its
+        events; see BatchJob for the arguments.
+        """
+        if archive_output:
+            output_dir = None
+            created_dir = False
+        else:
+            output_dir = self.batch_output_dir(operation)
+            created_dir = not os.path.isdir(output_dir)
+            try:
+                os.makedirs(output_dir, exist_ok=True)
+            except OSError as e:
+                messagebox.showerror("Batch Failed", f"Could not create output folder:\n{e}")
+                return
+        
+        colors = self.themes['dark' if self.is_dark_mode.get() else 'light']
+        profile = self.new_profile()
+        job = BatchJob(operation, output_dir, inputs, root, walk, resume, archive_input, archive_output,
+                       compression_level, BATCH_FSYNC, profile=profile,
+                       trace_memory=self.trace_memory_enabled.get())
+        total = job.total
+        
+        # Progress window
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title(f"Batch {operation.capitalize()}")
+        progress_window.configure(bg=colors['bg'])
+        progress_window.transient(self.root)
+        progress_window.resizable(False, False)
+        
+        main_frame = tk.Frame(progress_window, bg=colors['bg'])
+        main_frame.pack(fill="both", expand=True, padx=20, pady=20)
+        
+        progress_label = tk.Label(main_frame, text=f"0 / {total or '?'} files", font=('Segoe UI', 10),
+                                  bg=colors['bg'], fg=colors['label_fg'])
+        progress_label.pack(anchor="w")
+        
+        progress_bar = ttk.Progressbar(main_frame, orient="horizontal", length=400,
+                                       mode="determinate" if total else "indeterminate",
+                                       maximum=max(total or 0, 1))
+        progress_bar.pack(fill="x", pady=(5, 10))
+        if total is None:
+            progress_bar.start()
         
-        # Process files first, only create output directory if we have results
-        results = []
+        tk.Label(main_frame, text="Processed Files:", font=('Segoe UI', 10, 'bold'),
+                 bg=colors['bg'], fg=colors['label_fg']).pack(anchor="w")
+        
+        log_listbox = tk.Listbox(main_frame, height=6, bg=colors['text_bg'], fg=colors['text_fg'],
+                                 font=('Segoe UI', 9))
+        log_listbox.pack(fill="both", expand=True, pady=(5, 10))
+        
+        def cancel():
+            job.cancel()
+            cancel_button.config(state="disabled")
+            progress_label.config(text=progress_label.cget("text") + " (cancelling...)")
+        
+        cancel_button = ttk.Button(main_frame, text="Cancel", command=cancel)
+        cancel_button.pack()
+        progress_window.protocol("WM_DELETE_WINDOW", cancel)
+        
+        def batch_statistics(input_stats, output_stats):
+            # Like decode_action, report decoding as the reverse of an encode
+            if operation == "decode":
+                return compare_statistics(output_stats, input_stats)
+            return compare_statistics(input_stats, output_stats)
+        
+        saved_files = []
         errors = []
+        skipped = []
+        # Inputs whose copies were linked rather than processed, with the copies
+        duplicates = {}
+        # Aggregate statistics are merged from the per-file accumulators the
+        # workers return, so no second pass over the data is needed
+        total_input = EntropyAccumulator()
+        total_output = EntropyAccumulator()
         
-        for filepath in selected_files:
+        def poll():
+            nonlocal total
+            finished = False
             try:
-                with open(filepath, 'r', encoding="utf-8") as f:
-                    content = f.read()
-                
-                if operation == "encode":
-                    processed_content = encode_text(content)
-                    filename = os.path.basename(filepath)
-                    new_filename = f"encoded_{filename}"
-                else:
-                    processed_content = decode_text(content)
-                    filename = os.path.basename(filepath)
-                    new_filename = f"decoded_{filename}"
-                
-                results.append((processed_content, new_filename))
-                
-            except Exception as e:
-                filename = os.path.basename(filepath)
-                errors.append(f"{filename}: {str(e)}")
-        
-        # Only create output directory and save files if we have successful results
-        if results:
-            if operation == "encode":
-                output_dir = os.path.join(script_dir, "Encoded Output")
-            else:
-                output_dir = os.path.join(script_dir, "Decoded Output")
+                while True:
+                    kind, path, value = job.events.get_nowait()
+                    if kind == "done":
+                        new_filename = value["output"]
+                        input_stats, output_stats = value["input_stats"], value["output_stats"]
+                        saved_files.append(new_filename)
+                        if value.get("duplicate_of"):
+                            duplicates.setdefault(value["duplicate_of"], []).append(path)
+                            log_listbox.insert(tk.END, f"= {new_filename}: same content as "
+                                                       f"{os.path.basename(value['duplicate_of'])}, linked")
+                        elif input_stats is None:
+                            # Very large decodes run on raw bytes without statistics
+                            log_listbox.insert(tk.END, f"✓ {new_filename}: decoded as bytes, no statistics")
+                        else:
+                            total_input.merge(input_stats)
+                            total_output.merge(output_stats)
+                            stats = batch_statistics(input_stats, output_stats)
+                            log_listbox.insert(tk.END, f"✓ {new_filename}: {stats['Original Length']} → "
+                                                       f"{stats['Modified Length']} chars, "
+                                                       f"entropy {stats['Entropy Original']} → {stats['Entropy Modified']}")
+                    elif kind == "skipped":
+                        skipped.append(path)
+                    elif kind == "found":
+                        total = value
+                        progress_bar.stop()
+                        progress_bar.config(mode="determinate", maximum=max(total, 1))
+                    elif kind == "pruned":
+                        log_listbox.insert(tk.END, f"Removed the outputs of {value} deleted input files")
+                    elif kind == "error":
+                        name = os.path.basename(path) if path else "Batch"
+                        errors.append(f"{name}: {value}")
+                        log_listbox.insert(tk.END, f"✗ {errors[-1]}")
+                    else:
+                        finished = True
+            except queue.Empty:
+                pass
             
-            os.makedirs(output_dir, exist_ok=True)
+            processed = len(saved_files) + len(errors) + len(skipped)
+            if total is not None:
+                progress_bar.config(value=processed)
+            if not job.cancelled():
+                unchanged = f" ({len(skipped)} unchanged)" if skipped else ""
+                progress_label.config(text=f"{processed} / {total or '?'} files{unchanged}")
             
-            # Save all processed files
-            saved_files = []
-            for processed_content, new_filename in results:
-                try:
-                    output_path = os.path.join(output_dir, new_filename)
-                    with open(output_path, 'w', encoding="utf-8") as f:
-                        f.write(processed_content)
-                    saved_files.append(new_filename)
-                except Exception as e:
-                    errors.append(f"{new_filename}: Failed to save - {str(e)}")
-            
-            # Show results
-            if saved_files:
-                success_msg = f"Successfully {operation}d {len(saved_files)} files.\nOutput saved to: {output_dir}"
-                if errors:
-                    error_msg = f"\n\nErrors encountered:\n" + "\n".join(errors[:5])
-                    if len(errors) > 5:
-                        error_msg += f"\n... and {len(errors) - 5} more errors"
-                    messagebox.showinfo("Batch Complete", success_msg + error_msg)
-                else:
-                    messagebox.showinfo("Batch Complete", success_msg)
-                    self.show_status_message(f"✓ Batch {operation} completed: {len(saved_files)} files processed")
+            if finished:
+                progress_window.destroy()
+                if total_input.length or total_output.length:
+                    self.stats_text.config(text=self.format_stats(batch_statistics(total_input, total_output)))
+                self.finish_batch_operation(operation, archive_output or output_dir, created_dir, saved_files,
+                                            errors, job.cancelled(), len(skipped), job.incremental, duplicates)
+                self.show_profile(profile)
+            else:
+                self.root.after(100, poll)
+        
+        job.start()
+        self.root.after(100, poll)
+
+    def finish_batch_operation(self, operation, output_dir, created_dir, saved_files, errors, cancelled,
+                               skipped=0, resumable=True, duplicates=None):
+        """Report the outcome of a batch run; duplicates maps inputs to their linked copies"""
+        title = "Batch Cancelled" if cancelled else "Batch Complete"
+        if saved_files or skipped:
+            success_msg = f"Successfully {operation}d {len(saved_files)} files.\nOutput saved to: {output_dir}"
+            if skipped:
+                success_msg += f"\n{skipped} unchanged files were skipped."
+            if duplicates:
+                copies = sum(len(group) for group in duplicates.values())
+                success_msg += (f"\n{copies} duplicate files in {len(duplicates)} groups reuse the "
+                                f"output of the first copy:")
+                for original, group in list(duplicates.items())[:5]:
+                    success_msg += f"\n  {os.path.basename(original)} = " + ", ".join(
+                        os.path.basename(path) for path in group[:3])
+                    if len(group) > 3:
+                        success_msg += f" and {len(group) - 3} more"
+                if len(duplicates) > 5:
+                    success_msg += f"\n  ... and {len(duplicates) - 5} more groups"
+            if cancelled and resumable:
+                success_msg += "\nThe rest can be resumed from Batch Mode."
+            if errors:
+                error_msg = f"\n\nErrors encountered:\n" + "\n".join(errors[:5])
+                if len(errors) > 5:
+                    error_msg += f"\n... and {len(errors) - 5} more errors"
+                messagebox.showinfo(title, success_msg + error_msg)
             else:
-                messagebox.showerror("Batch Failed", "No files were saved successfully.\n\nErrors:\n" + "\n".join(errors[:10]))
+                messagebox.showinfo(title, success_msg)
+                self.show_status_message(f"✓ Batch {operation} completed: {len(saved_files)} files processed")
         else:
-            messagebox.showerror("Batch Failed", "No files were processed successfully.\n\nErrors:\n" + "\n".join(errors[:10]))
+            if created_dir:
+                try:
+                    os.rmdir(output_dir)
+                except OSError:
+                    pass
+            if cancelled and not errors:
+                messagebox.showinfo(title, "Batch cancelled before any files were processed.")
+            else:
+                messagebox.showerror("Batch Failed", "No files were processed successfully.\n\nErrors:\n" + "\n".join(errors[:10]))
 
-    def display_stats(self, original, modified):
-        stats = get_text_statistics(original, modified)
-        stat_text = "\n".join([f"{k}: {v}" for k, v in stats.items()])
-        self.stats_text.config(text=stat_text)
+    def format_stats(self, stats):
+        return "\n".join([f"{k}: {v}" for k, v in stats.items()])
 
 
 if __name__ == '__main__':
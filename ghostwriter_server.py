@@ -0,0 +1,445 @@
+"""Local HTTP service exposing the GhostWriter transforms to other processes.
+
+Usage:
+    python ghostwriter_server.py [--host 127.0.0.1] [--port 8765] [--max-concurrent 4]
+
+Endpoints:
+    POST /decode      UTF-8 text in, the same text without invisible characters out (streamed)
+    POST /statistics  UTF-8 text in, JSON statistics of the text against its decoded form out
+    GET  /metrics     JSON request counts, latency percentiles and throughput
+    GET  /health      200 as long as the server is up
+
+Request bodies may be sent with Content-Length or chunked transfer encoding.
+They are processed a chunk at a time as they arrive, so memory stays bounded
+whatever their size, and the transforms run on an executor so the event loop
+is always free to accept and stream other requests. Only --max-concurrent
+requests are processed at once; up to --max-queued more wait for a slot and
+anything beyond that is turned away with 503.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from ghostwriter_core import CHUNK_SIZE, EntropyAccumulator, compare_statistics, decode_text
+
+DEFAULT_PORT = 8765
+HEADER_LIMIT = 1 << 16  # Largest request line plus headers accepted
+LINGER_SECONDS = 2  # How long unwanted request bodies are drained after an error response
+LATENCY_WINDOW = 1024  # Recent requests the latency percentiles are computed over
+REASONS = {
+    100: "Continue", 200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    408: "Request Timeout", 411: "Length Required", 431: "Request Header Fields Too Large",
+    500: "Internal Server Error", 501: "Not Implemented", 503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def split_utf8(data):
+    """Split bytes into (complete UTF-8 sequences, trailing incomplete sequence)"""
+    end = len(data)
+    start = max(end - 3, 0)
+    # Look back to the last lead byte; if its sequence runs past the end, hold it back
+    for i in range(end - 1, start - 1, -1):
+        byte = data[i]
+        if byte < 0x80:
+            break
+        if byte >= 0xC0:
+            needed = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            if end - i < needed:
+                return data[:i], data[i:]
+            break
+    return data, b''
+
+
+def decode_chunk(data):
+    """Executor job for /decode: UTF-8 bytes in, decoded UTF-8 bytes out"""
+    return decode_text(data.decode("utf-8")).encode("utf-8")
+
+
+def chunk_statistics(data):
+    """Executor job for /statistics: accumulators for the chunk and for its decoded form"""
+    text = data.decode("utf-8")
+    return EntropyAccumulator(text), EntropyAccumulator(decode_text(text))
+
+
+class Metrics:
+    """Request counters and a window of recent latencies, reported by /metrics"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.started = time.monotonic()
+        self.requests = Counter()
+        self.responses = Counter()
+        self.recent = deque(maxlen=window)  # (seconds, bytes in) per processed request
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+
+    def record(self, endpoint, status, seconds, bytes_in, bytes_out):
+        self.requests[endpoint] += 1
+        self.responses[str(status)] += 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        if status == 200 and endpoint in ("/decode", "/statistics"):
+            self.recent.append((seconds, bytes_in))
+
+    def snapshot(self):
+        uptime = time.monotonic() - self.started
+        latencies = sorted(seconds for seconds, _ in self.recent)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3)
+
+        busy = sum(seconds for seconds, _ in self.recent)
+        return {
+            "uptime_s": round(uptime, 3),
+            "requests": dict(self.requests),
+            "responses": dict(self.responses),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "latency_ms": {
+                "samples": len(latencies),
+                "mean": round(busy / len(latencies) * 1000, 3) if latencies else None,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(latencies[-1] * 1000, 3) if latencies else None,
+            },
+            # Per request, over the latency window, and for everything received since start-up
+            "request_mb_per_s": round(sum(n for _, n in self.recent) / (1 << 20) / busy, 3) if busy else None,
+            "mb_in_per_s": round(self.bytes_in / (1 << 20) / uptime, 3) if uptime else None,
+        }
+
+
+class Request:
+    def __init__(self, method, path, version, headers, reader):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.reader = reader
+        self.bytes_read = 0
+        self.body_done = False
+        self.response_started = False
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.1":
+            return connection != "close"
+        return connection == "keep-alive"
+
+    async def iter_body(self, chunk_size=CHUNK_SIZE):
+        """Yield the body as byte chunks of about chunk_size, undoing any chunked encoding"""
+        buffer = []
+        buffered = 0
+        async for data in self.iter_raw_body(chunk_size):
+            buffer.append(data)
+            buffered += len(data)
+            # The socket hands over 64 KB or less at a time; hand the executor bigger pieces
+            if buffered >= chunk_size:
+                yield b''.join(buffer)
+                buffer = []
+                buffered = 0
+        if buffer:
+            yield b''.join(buffer)
+        self.body_done = True
+
+    async def iter_raw_body(self, chunk_size):
+        if self.headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                line = await self.reader.readline()
+                try:
+                    remaining = int(line.split(b";")[0].strip(), 16)
+                except ValueError:
+                    remaining = -1
+                if remaining < 0:
+                    raise HTTPError(400, "malformed chunk size")
+                if not remaining:
+                    # Skip any trailers up to the blank line that ends the body
+                    while (await self.reader.readline()).strip():
+                        pass
+                    return
+                async for data in self.read_exactly(remaining, chunk_size):
+                    yield data
+                await self.reader.readline()
+        else:
+            try:
+                remaining = int(self.headers.get("content-length", 0))
+            except ValueError:
+                remaining = -1
+            if remaining < 0:
+                raise HTTPError(400, "malformed Content-Length")
+            async for data in self.read_exactly(remaining, chunk_size):
+                yield data
+
+    async def read_exactly(self, remaining, chunk_size):
+        while remaining:
+            data = await self.reader.read(min(remaining, chunk_size))
+            if not data:
+                raise HTTPError(400, "request body ended early")
+            remaining -= len(data)
+            self.bytes_read += len(data)
+            yield data
+
+    async def iter_utf8(self, chunk_size=CHUNK_SIZE):
+        """Like iter_body, but never splitting a UTF-8 sequence between chunks"""
+        carry = b''
+        async for data in self.iter_body(chunk_size):
+            data, carry = split_utf8(carry + data)
+            if data:
+                yield data
+        if carry:
+            raise HTTPError(400, "request body is not valid UTF-8")
+
+
+class GhostWriterServer:
+    def __init__(self, max_concurrent=4, max_queued=64, processes=0, chunk_size=CHUNK_SIZE, timeout=30):
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.max_queued = max_queued
+        self.slots = asyncio.Semaphore(max_concurrent)
+        if processes:
+            self.executor = ProcessPoolExecutor(processes)
+        else:
+            self.executor = ThreadPoolExecutor(max_concurrent)
+        self.metrics = Metrics()
+        self.routes = {
+            "/decode": ("POST", self.handle_decode),
+            "/statistics": ("POST", self.handle_statistics),
+            "/metrics": ("GET", self.handle_metrics),
+            "/health": ("GET", self.handle_health),
+        }
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT):
+        return await asyncio.start_server(self.handle_connection, host, port, limit=HEADER_LIMIT)
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    async def run(self, func, data):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, data)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.timeout)
+                except asyncio.LimitOverrunError:
+                    await self.send_json(writer, 431, {"error": "request headers too large"}, keep_alive=False)
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    break
+                if not await self.handle_request(head, reader, writer):
+                    break
+        except OSError:
+            # Resets, and sockets the client already shut down (ENOTCONN)
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def handle_request(self, head, reader, writer):
+        """Handle one request; return whether the connection can be reused"""
+        started = time.perf_counter()
+        request = None
+        status = 400
+        bytes_out = 0
+        try:
+            request = self.parse_request(head, reader)
+            method, handler = self.routes.get(request.path, (None, None))
+            if handler is None:
+                raise HTTPError(404, f"no such endpoint: {request.path}")
+            if request.method != method:
+                raise HTTPError(405, f"{request.path} expects {method}")
+            if method == "POST":
+                if "content-length" not in request.headers and "transfer-encoding" not in request.headers:
+                    raise HTTPError(411, "send Content-Length or chunked transfer encoding")
+                if self.metrics.queued >= self.max_queued and self.slots.locked():
+                    self.metrics.rejected += 1
+                    raise HTTPError(503, "too many requests in progress, retry later")
+                self.metrics.queued += 1
+                try:
+                    await self.slots.acquire()
+                finally:
+                    self.metrics.queued -= 1
+                self.metrics.in_flight += 1
+                try:
+                    if request.headers.get("expect", "").lower() == "100-continue":
+                        writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                    status, bytes_out = await handler(request, writer)
+                finally:
+                    self.metrics.in_flight -= 1
+                    self.slots.release()
+            else:
+                status, bytes_out = await handler(request, writer)
+        except HTTPError as e:
+            status = e.status
+            if request is not None and request.response_started:
+                # Too late for an error response; cut the stream short instead
+                writer.transport.abort()
+                return False
+            bytes_out = await self.send_json(writer, status, {"error": str(e)}, keep_alive=False)
+            if request is not None and not request.body_done:
+                await self.discard_body(reader, writer)
+            return False
+        except (OSError, asyncio.CancelledError):
+            status = 499
+            raise
+        finally:
+            if request is not None:
+                self.metrics.record(request.path, status, time.perf_counter() - started,
+                                    request.bytes_read, bytes_out)
+        return request.keep_alive and request.body_done
+
+    def parse_request(self, head, reader):
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ")
+        except ValueError:
+            raise HTTPError(400, "malformed request line") from None
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "chunked").lower() != "chunked":
+            raise HTTPError(501, "only chunked transfer encoding is supported")
+        request = Request(method, target.split("?", 1)[0], version, headers, reader)
+        request.body_done = method != "POST"
+        return request
+
+    async def discard_body(self, reader, writer):
+        """Read and drop what the client is still sending, so it gets to see the error
+        response instead of a connection reset; gives up after LINGER_SECONDS"""
+        deadline = time.monotonic() + LINGER_SECONDS
+        try:
+            if writer.can_write_eof():
+                writer.write_eof()
+            while time.monotonic() < deadline:
+                if not await asyncio.wait_for(reader.read(HEADER_LIMIT), deadline - time.monotonic()):
+                    return
+        except (asyncio.TimeoutError, OSError):
+            # Including a client that is already gone, where write_eof fails with ENOTCONN
+            pass
+
+    async def send_json(self, writer, status, payload, keep_alive=True):
+        body = json.dumps(payload, indent=1).encode("utf-8") + b"\n"
+        writer.write(self.response_head(status, "application/json", keep_alive, len(body)) + body)
+        await writer.drain()
+        return len(body)
+
+    def response_head(self, status, content_type, keep_alive, length=None, chunked=False):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {content_type}"]
+        if chunked:
+            lines.append("Transfer-Encoding: chunked")
+        elif length is not None:
+            lines.append(f"Content-Length: {length}")
+        if status == 503:
+            lines.append("Retry-After: 1")
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def handle_decode(self, request, writer):
+        # HTTP/1.0 clients get the body unframed, ended by closing the connection
+        chunked = request.version == "HTTP/1.1"
+        keep_alive = request.keep_alive and chunked
+        sent = 0
+        async for data in request.iter_utf8(self.chunk_size):
+            try:
+                decoded = await self.run(decode_chunk, data)
+            except UnicodeDecodeError:
+                raise HTTPError(400, "request body is not valid UTF-8") from None
+            if not request.response_started:
+                # Held back until the first chunk is through, so invalid input still gets a 400
+                writer.write(self.response_head(200, "text/plain; charset=utf-8", keep_alive, chunked=chunked))
+                request.response_started = True
+            if decoded:
+                writer.write(b"%x\r\n%s\r\n" % (len(decoded), decoded) if chunked else decoded)
+                sent += len(decoded)
+            await writer.drain()
+        if not request.response_started:
+            writer.write(self.response_head(200, "text/plain; charset=utf-8", request.keep_alive, 0))
+        elif chunked:
+            writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        if not keep_alive:
+            request.body_done = False
+        return 200, sent
+
+    async def handle_statistics(self, request, writer):
+        original = EntropyAccumulator()
+        decoded = EntropyAccumulator()
+        async for data in request.iter_utf8(self.chunk_size):
+            try:
+                chunk_original, chunk_decoded = await self.run(chunk_statistics, data)
+            except UnicodeDecodeError:
+                raise HTTPError(400, "request body is not valid UTF-8") from None
+            original.merge(chunk_original)
+            decoded.merge(chunk_decoded)
+        # Reported like decoding in the GUI: as the reverse of an encode
+        stats = compare_statistics(decoded, original)
+        return 200, await self.send_json(writer, 200, stats, request.keep_alive)
+
+    async def handle_metrics(self, request, writer):
+        return 200, await self.send_json(writer, 200, self.metrics.snapshot(), request.keep_alive)
+
+    async def handle_health(self, request, writer):
+        return 200, await self.send_json(writer, 200, {"status": "ok"}, request.keep_alive)
+
+
+async def serve(args):
+    app = GhostWriterServer(args.max_concurrent, args.max_queued, args.processes, timeout=args.timeout)
+    server = await app.start(args.host, args.port)
+    try:
+        for sock in server.sockets:
+            host, port = sock.getsockname()[:2]
+            print(f"Listening on http://{host}:{port}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+    finally:
+        app.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the GhostWriter decoder and statistics over local HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help=f"port to listen on, 0 for any free one (default: {DEFAULT_PORT})")
+    parser.add_argument("--max-concurrent", type=int, default=4,
+                        help="requests processed at once (default: 4)")
+    parser.add_argument("--max-queued", type=int, default=64,
+                        help="requests waiting for a slot before new ones get 503 (default: 64)")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="transform on this many worker processes instead of threads, for "
+                             "CPU-bound loads across cores (default: 0, threads)")
+    parser.add_argument("--timeout", type=float, default=30,
+                        help="seconds an idle connection is kept open (default: 30)")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
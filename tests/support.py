@@ -0,0 +1,62 @@
+"""Helpers shared by the tests"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from ghostwriter_batch import BatchJob
+from ghostwriter_core import encode_text
+
+# Words, whitespace of several kinds, and invisible characters alone and in runs
+ALPHABET = (list("ab ") + ["\n", "\t", "\xa0", "\u3000", "\xe9", "\u6f22", "\U0001f600", "\u200b", "\u200e",
+                            "\u200e\u200e", "\ufeff", "\u2800", "\u3164", "\u2062"])
+
+
+def random_chunks(rng, text):
+    """Cut text into up to 9 chunks at random places, empty chunks included"""
+    cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(0, 8))))
+    return [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+
+def random_text(rng, alphabet=ALPHABET, length=40):
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, length)))
+
+
+def run_job(operation="decode", **options):
+    """Run a BatchJob to the end; return it and its events"""
+    job = BatchJob(operation, workers=2, **options)
+    job.run()
+    events = []
+    while not job.events.empty():
+        events.append(job.events.get())
+    return job, events
+
+
+def events_of(events, kind):
+    return [(path, value) for event, path, value in events if event == kind]
+
+
+class BatchTestCase(unittest.TestCase):
+    """A temporary folder with encoded inputs below self.root, and self.output_dir next to it"""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.root = os.path.join(self.folder, "in")
+        self.output_dir = os.path.join(self.folder, "out")
+        self.texts = {}
+        for i in range(8):
+            # Pairs of identical files, some in a subfolder
+            self.write(os.path.join("sub" if i % 2 else "", f"{i}.txt"), f"hello world {i // 2}")
+
+    def write(self, name, text):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding="utf-8") as f:
+            f.write(encode_text(text))
+        self.texts[name] = text
+
+    def read_output(self, name):
+        directory, base = os.path.split(name)
+        with open(os.path.join(self.output_dir, directory, "decoded_" + base), encoding="utf-8") as f:
+            return f.read()
@@ -0,0 +1,27 @@
+import os
+import tarfile
+import unittest
+
+from ghostwriter_core import decode_text
+from support import BatchTestCase, events_of, run_job
+
+
+class ArchiveTest(BatchTestCase):
+    def test_archive_output_and_input(self):
+        archive = os.path.join(self.folder, "out.tar.gz")
+        _, events = run_job(root=self.root, archive_output=archive)
+        self.assertEqual(events_of(events, "error"), [])
+        with tarfile.open(archive) as tar:
+            names = sorted(member.name for member in tar)
+        self.assertEqual(names, sorted(os.path.join(os.path.dirname(name), "decoded_" + os.path.basename(name))
+                                       .replace(os.sep, "/") for name in self.texts))
+        # No spool folder is left next to the archive
+        self.assertEqual(sorted(os.listdir(self.folder)), ["in", "out.tar.gz"])
+        _, events = run_job("encode", output_dir=self.output_dir, archive_input=archive)
+        self.assertEqual(len(events_of(events, "done")), 8)
+        with open(os.path.join(self.output_dir, "sub", "encoded_decoded_1.txt"), encoding="utf-8") as f:
+            self.assertEqual(decode_text(f.read()), self.texts[os.path.join("sub", "1.txt")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from ghostwriter_batch import process_file
+from ghostwriter_core import decode_text, decode_file_mmap, encode_text
+
+CLI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "antiantiplagiarism.py")
+TEXT = encode_text("Gr\u00fc\u00dfe aus \u6771\u4eac, line one") + "\r\n" + encode_text("line two") + "\r" + encode_text("three") + "\n"
+
+
+class DecodeFileTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.output = os.path.join(self.folder, "out.txt")
+
+    def decode(self, path, **options):
+        subprocess.run([sys.executable, CLI, "-D", path, "-o", self.output], check=True,
+                       stderr=subprocess.DEVNULL, **options)
+        with open(self.output, 'rb') as f:
+            return f.read().decode("utf-8")
+
+    def test_regular_file(self):
+        path = os.path.join(self.folder, "in.txt")
+        with open(path, 'w', encoding="utf-8", newline="") as f:
+            f.write(TEXT)
+        self.assertEqual(self.decode(path), decode_text(TEXT))
+
+    def test_line_endings_on_every_path(self):
+        path = os.path.join(self.folder, "in.txt")
+        with open(path, 'w', encoding="utf-8", newline="") as f:
+            f.write(TEXT)
+        expected = decode_text(TEXT).encode("utf-8")
+        self.assertIn(b"\r\n", expected)
+        decode_file_mmap(path, self.output)
+        with open(self.output, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+        result = process_file("decode", path, self.folder)
+        with open(os.path.join(self.folder, result["output"]), 'rb') as f:
+            self.assertEqual(f.read(), expected)
+        self.assertEqual(process_file("decode", path, self.folder, in_memory=True)["data"], expected)
+
+    @unittest.skipUnless(os.path.isdir("/dev/fd"), "needs /dev/fd")
+    def test_pipe(self):
+        # What a shell passes for <(cat file): a path with no size to map
+        read_end, write_end = os.pipe()
+
+        def feed():
+            with open(write_end, 'wb') as f:
+                f.write(TEXT.encode("utf-8"))
+
+        writer = threading.Thread(target=feed)
+        writer.start()
+        try:
+            decoded = self.decode(f"/dev/fd/{read_end}", pass_fds=(read_end,))
+        finally:
+            writer.join()
+            os.close(read_end)
+        self.assertEqual(decoded, decode_text(TEXT))
+
+
+if __name__ == '__main__':
+    unittest.main()
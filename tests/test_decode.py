@@ -0,0 +1,34 @@
+import sys
+import unicodedata
+import unittest
+from collections import Counter
+
+from ghostwriter_core import NUMPY_MIN_LENGTH, EntropyAccumulator, decode_text, invisible_chars
+
+# Long enough for the NumPy paths, with a lone surrogate as pasted text can have
+TEXT = "a\u200b\ud800b\u200ec\udfff" * (NUMPY_MIN_LENGTH // 4)
+
+
+class LoneSurrogateTest(unittest.TestCase):
+    def test_decode_with_offsets(self):
+        decoded, offsets = decode_text(TEXT, offsets=True)
+        self.assertEqual(decoded, "a\ud800bc\udfff" * (NUMPY_MIN_LENGTH // 4))
+        self.assertEqual(offsets[:6].tolist(), [0, 2, 3, 5, 6, 7])
+        self.assertEqual(offsets[-1], len(TEXT))
+
+    def test_entropy_counts(self):
+        accumulator = EntropyAccumulator(TEXT)
+        self.assertEqual(accumulator.counts, Counter(TEXT))
+        self.assertEqual(accumulator.length, len(TEXT))
+
+
+class InvisibleCharsTest(unittest.TestCase):
+    def test_every_format_character(self):
+        # FORMAT_RANGES must keep up with the Unicode version of this Python
+        missing = [hex(cp) for cp in range(sys.maxunicode + 1)
+                   if unicodedata.category(chr(cp)) == "Cf" and chr(cp) not in invisible_chars()]
+        self.assertEqual(missing, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
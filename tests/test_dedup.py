@@ -0,0 +1,35 @@
+import os
+import unittest
+
+from ghostwriter_batch import PREFETCH_MAX_SIZE
+from support import BatchTestCase, events_of, run_job
+
+
+class DedupTest(BatchTestCase):
+    def test_duplicates_are_linked(self):
+        _, events = run_job(output_dir=self.output_dir, root=self.root)
+        duplicates = [result["duplicate_of"] for _, result in events_of(events, "done") if result.get("duplicate_of")]
+        self.assertEqual(len(duplicates), 4)
+        first = os.path.join(self.output_dir, "decoded_0.txt")
+        copy = os.path.join(self.output_dir, "sub", "decoded_1.txt")
+        self.assertTrue(os.path.samefile(first, copy))
+
+    def test_large_duplicates_are_linked(self):
+        # Too large to be hashed ahead, so the workers hash them
+        text = " ".join(["lorem ipsum dolor"] * (PREFETCH_MAX_SIZE // 16))
+        for name in ("big0.txt", "big1.txt", os.path.join("sub", "big2.txt")):
+            self.write(name, text)
+        self.write("big3.txt", text + "x")
+        _, events = run_job(output_dir=self.output_dir, root=self.root)
+        self.assertEqual(events_of(events, "error"), [])
+        outputs = [os.path.join(self.output_dir, name) for name in
+                   ("decoded_big0.txt", "decoded_big1.txt", os.path.join("sub", "decoded_big2.txt"))]
+        self.assertTrue(os.path.samefile(outputs[0], outputs[1]))
+        self.assertTrue(os.path.samefile(outputs[0], outputs[2]))
+        self.assertFalse(os.path.samefile(outputs[0], os.path.join(self.output_dir, "decoded_big3.txt")))
+        for name, text in self.texts.items():
+            self.assertEqual(self.read_output(name), text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from ghostwriter_batch import (
+    BatchJob,
+    BatchJournal,
+    journal_path_for,
+    load_manifest,
+    manifest_key,
+    manifest_path_for,
+    read_journal,
+    replay_journal,
+)
+from support import BatchTestCase, events_of, run_job
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.path = os.path.join(self.folder, "job.journal")
+
+    def write_job(self, count):
+        journal = BatchJournal(self.path)
+        journal.start("encode", inputs=[f"{i}.txt" for i in range(count)])
+        for i in range(count):
+            journal.record("done", path=f"{i}.txt", entry={"output": f"encoded_{i}.txt", "size": i})
+        journal.close()
+
+    def test_replay(self):
+        self.write_job(5)
+        job = read_journal(self.path)
+        self.assertEqual(job["start"]["operation"], "encode")
+        self.assertIsNone(job["end"])
+        manifest = {"entries": {}}
+        self.assertEqual(replay_journal(manifest, job), 5)
+        self.assertEqual(manifest["entries"][manifest_key("3.txt")], {"output": "encoded_3.txt", "size": 3})
+
+    def test_torn_last_line(self):
+        # A crash can stop the journal anywhere; only whole records count
+        self.write_job(20)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        # Where each "done" record's JSON ends, not counting its line break
+        ends = [i for i, byte in enumerate(data) if byte == ord("\n")][1:]
+        rng = random.Random(8)
+        for _ in range(200):
+            cut = rng.randint(data.index(b"\n") + 1, len(data))
+            with open(self.path, 'wb') as f:
+                f.write(data[:cut])
+            complete = sum(cut >= end for end in ends)
+            job = read_journal(self.path)
+            manifest = {"entries": {}}
+            self.assertEqual(replay_journal(manifest, job), complete, cut)
+            self.assertEqual(sorted(manifest["entries"]), sorted(manifest_key(f"{i}.txt") for i in range(complete)))
+
+    def test_cancelled_and_resumed(self):
+        self.write_job(2)
+        journal = BatchJournal(self.path)
+        journal.resume()
+        journal.record("cancelled")
+        journal.close()
+        self.assertEqual(read_journal(self.path)["end"], "cancelled")
+        journal.resume()
+        journal.record("done", path="2.txt", entry={"output": "encoded_2.txt"})
+        journal.close()
+        job = read_journal(self.path)
+        self.assertIsNone(job["end"])
+        self.assertEqual(len(job["done"]), 3)
+
+    def test_missing_journal(self):
+        self.assertIsNone(read_journal(self.path))
+
+
+class ResumeTest(BatchTestCase):
+    def test_resume_after_interruption(self):
+        # A journal left behind by a job that stopped after two files
+        names = sorted(self.texts)
+        job, _ = run_job(output_dir=self.output_dir, inputs=[os.path.join(self.root, name) for name in names[:2]])
+        journal = BatchJournal(journal_path_for(self.output_dir))
+        journal.start("decode", inputs=[os.path.join(self.root, name) for name in names])
+        for path, entry in load_manifest(manifest_path_for(self.output_dir))["entries"].items():
+            journal.record("done", path=path, entry=entry)
+        journal.close()
+        os.remove(manifest_path_for(self.output_dir))
+        _, events = run_job(output_dir=self.output_dir, inputs=[os.path.join(self.root, name) for name in names],
+                            resume=True)
+        self.assertEqual(len(events_of(events, "skipped")), 2)
+        self.assertEqual(len(events_of(events, "done")), 6)
+
+    def test_cancel_before_start(self):
+        job = BatchJob("decode", self.output_dir, root=self.root, workers=1)
+        job.cancel()
+        job.run()
+        self.assertFalse(job.completed)
+        # The journal is kept for resuming
+        self.assertEqual(read_journal(journal_path_for(self.output_dir))["end"], "cancelled")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import shutil
+import unittest
+
+from ghostwriter_core import encode_text
+from support import BatchTestCase, events_of, run_job
+
+
+class ManifestTest(BatchTestCase):
+    def test_rerun_skips_unchanged_and_prunes_deleted(self):
+        run_job(output_dir=self.output_dir, root=self.root)
+        self.write("2.txt", "changed")
+        os.remove(os.path.join(self.root, "4.txt"))
+        _, events = run_job(output_dir=self.output_dir, root=self.root)
+        self.assertEqual([os.path.basename(path) for path, _ in events_of(events, "done")], ["2.txt"])
+        self.assertEqual(len(events_of(events, "skipped")), 6)
+        self.assertEqual(events_of(events, "pruned"), [(None, 1)])
+        self.assertEqual(self.read_output("2.txt"), "changed")
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, "decoded_4.txt")))
+
+    def test_prune_keeps_other_folders(self):
+        other = os.path.join(self.folder, "other")
+        os.makedirs(other)
+        with open(os.path.join(other, "x.txt"), 'w', encoding="utf-8") as f:
+            f.write(encode_text("elsewhere"))
+        run_job(output_dir=self.output_dir, root=other)
+        shutil.rmtree(other)
+        _, events = run_job(output_dir=self.output_dir, root=self.root)
+        self.assertEqual(events_of(events, "pruned"), [])
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "decoded_x.txt")))
+
+    def test_same_name_in_other_folder(self):
+        # 0.txt and sub/0.txt both become decoded_0.txt without a common root
+        self.write(os.path.join("sub", "0.txt"), "from the subfolder")
+        first, second = os.path.join(self.root, "0.txt"), os.path.join(self.root, "sub", "0.txt")
+        for path in (first, second, first):
+            _, events = run_job(output_dir=self.output_dir, inputs=[path])
+            self.assertEqual(events_of(events, "done")[0][0], path)
+        self.assertEqual(self.read_output("0.txt"), self.texts["0.txt"])
+        # Only now is the output the first input's again
+        _, events = run_job(output_dir=self.output_dir, inputs=[first])
+        self.assertEqual(events_of(events, "skipped"), [(first, None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import random
+import re
+import unicodedata
+import unittest
+from itertools import combinations
+
+from ghostwriter_core import NORMALIZE_STEPS, Normalizer, decode_text
+from support import random_chunks
+
+# Characters that interact across a cut: jamo that compose in threes,
+# starters that compose (Oriya, Hangul), combining marks, characters that
+# are stripped or turn into spaces or line breaks, and a little ASCII
+ALPHABET = (list("ab \t\r\n") +
+            ["\u1100", "\u1161", "\u11a8", "\uac00", "\u0b47", "\u0b3e", "\u0301", "e", "\ufb01", "\u3000",
+             "\xa0", "\u200b", "\u200e", "\ufeff", "\u2800", "\u2028", "\x85", "\u2460", "\uff21", "\xa8",
+             "\uff9e", "\ud55c"])
+
+
+def clean_naively(text, steps):
+    if "strip" in steps:
+        text = decode_text(text)
+    if "nfkc" in steps:
+        text = unicodedata.normalize("NFKC", text)
+    if "newlines" in steps:
+        text = re.sub(r"\r\n?|[\x85\u2028\u2029]", "\n", text)
+    if "whitespace" in steps:
+        text = re.sub(r"[^\S\n\r\x85\u2028\u2029]+", " ", text)
+    return text
+
+
+class NormalizerTest(unittest.TestCase):
+    def test_matches_the_steps_chained(self):
+        rng = random.Random(1)
+        for r in range(len(NORMALIZE_STEPS) + 1):
+            for steps in combinations(NORMALIZE_STEPS, r):
+                normalizer = Normalizer.from_steps(steps)
+                for _ in range(300):
+                    text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 30)))
+                    self.assertEqual(normalizer(text), clean_naively(text, steps), (steps, text))
+
+    def test_stream_matches_whole_text(self):
+        rng = random.Random(2)
+        alphabets = [ALPHABET, [char for char in ALPHABET if not char.isascii()]]
+        for r in range(len(NORMALIZE_STEPS) + 1):
+            for steps in combinations(NORMALIZE_STEPS, r):
+                normalizer = Normalizer.from_steps(steps)
+                for _ in range(400):
+                    alphabet = rng.choice(alphabets)
+                    text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+                    chunks = random_chunks(rng, text)
+                    self.assertEqual("".join(normalizer.stream(chunks)), normalizer(text), (steps, chunks))
+
+    def test_stream_keeps_decomposed_hangul_together(self):
+        normalizer = Normalizer()
+        # L V | T composes into one syllable only when cleaned together
+        self.assertEqual("".join(normalizer.stream(["\u1100\u1161", "\u11a8"])), "\uac01")
+        self.assertEqual("".join(normalizer.stream(["\u1100", "\u1161", "\u11a8"])), "\uac01")
+        self.assertEqual("".join(normalizer.stream(["\u1100\u1161\u200b", "\u11a8"])), "\uac01")
+
+    def test_unknown_step(self):
+        with self.assertRaises(ValueError):
+            Normalizer.from_steps(["nfkc", "lowercase"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import random
+import unittest
+
+from ghostwriter_core import decode_text, invisible_chars, removed_spans
+from support import ALPHABET, random_text
+
+
+class OffsetsTest(unittest.TestCase):
+    def check(self, text, chars=None):
+        invisible = invisible_chars() if chars is None else set(chars)
+        decoded, offsets, spans = decode_text(text, chars, offsets=True, spans=True)
+        kept = [i for i, char in enumerate(text) if char not in invisible]
+        self.assertEqual(decoded, "".join(text[i] for i in kept))
+        self.assertEqual(decoded, decode_text(text, chars))
+        self.assertEqual(offsets.tolist(), kept + [len(text)])
+        # A decoded character is marked when invisible ones came right before it
+        marked = [i for i in range(len(kept)) if kept[i] > (kept[i - 1] + 1 if i else 0)]
+        expected = []
+        for i in marked:
+            if expected and expected[-1][1] == i:
+                expected[-1] = (expected[-1][0], i + 1)
+            else:
+                expected.append((i, i + 1))
+        self.assertEqual([tuple(span) for span in spans], expected, text)
+        self.assertEqual([tuple(span) for span in removed_spans(offsets)], expected)
+
+    def test_sparse_and_dense_text(self):
+        rng = random.Random(6)
+        plain = [char for char in ALPHABET if char not in invisible_chars()]
+        for _ in range(300):
+            # From a few invisible characters in a long text to mostly invisible ones
+            text = random_text(rng, plain * rng.choice((1, 5, 50, 500)) + ALPHABET, 600)
+            self.check(text)
+
+    def test_own_characters(self):
+        rng = random.Random(7)
+        for _ in range(300):
+            self.check(random_text(rng, list("abc\u200b\u200e\xe9"), 200), chars="\u200b\xe9")
+        # Characters that the default set leaves alone, ASCII ones included
+        for text, chars in (("\xe9\xa0b\u3000c", "\xa0\u3000"), ("\xe9\tb", "\t"), ("a\x00b", "\x00"),
+                            ("plain", "a")):
+            self.check(text, chars)
+
+    def test_ascii_and_empty_text(self):
+        self.check("")
+        self.check("plain text")
+        self.assertEqual(decode_text("plain", offsets=True, spans=True)[2], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import asyncio
+import http.client
+import json
+import random
+import socket
+import threading
+import unittest
+
+from ghostwriter_core import EntropyAccumulator, compare_statistics, decode_text, encode_text
+from ghostwriter_server import GhostWriterServer, split_utf8
+
+# Multibyte characters on both sides of the invisible ones, so that chunks split sequences
+TEXT = encode_text("Gr\u00fc\u00dfe aus \u6771\u4eac \U0001f600 and plain ASCII words ") * 40
+
+
+class ServerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.loop = asyncio.new_event_loop()
+        cls.thread = threading.Thread(target=cls.loop.run_forever, daemon=True)
+        cls.thread.start()
+        # A tiny chunk size makes every request cross many chunk boundaries
+        cls.app = GhostWriterServer(max_concurrent=2, chunk_size=7, timeout=5)
+        cls.server = asyncio.run_coroutine_threadsafe(cls.app.start(port=0), cls.loop).result()
+        cls.port = cls.server.sockets[0].getsockname()[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        async def stop():
+            cls.server.close()
+            await cls.server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(stop(), cls.loop).result()
+        cls.app.close()
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join()
+        cls.loop.close()
+
+    def connect(self):
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        self.addCleanup(connection.close)
+        return connection
+
+    def request(self, method, path, body=None, connection=None, **options):
+        connection = connection or self.connect()
+        connection.request(method, path, body, **options)
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    def test_decode(self):
+        status, body = self.request("POST", "/decode", TEXT.encode("utf-8"))
+        self.assertEqual(status, 200)
+        self.assertEqual(body.decode("utf-8"), decode_text(TEXT))
+
+    def test_decode_chunked_at_random_boundaries(self):
+        rng = random.Random(9)
+        data = TEXT.encode("utf-8")
+        for _ in range(10):
+            cuts = sorted(rng.sample(range(1, len(data)), 20))
+            chunks = [data[start:end] for start, end in zip([0] + cuts, cuts + [len(data)])]
+            status, body = self.request("POST", "/decode", iter(chunks), encode_chunked=True,
+                                        headers={"Transfer-Encoding": "chunked"})
+            self.assertEqual(status, 200)
+            self.assertEqual(body.decode("utf-8"), decode_text(TEXT))
+
+    def test_keep_alive(self):
+        connection = self.connect()
+        for text in ("first", TEXT, ""):
+            status, body = self.request("POST", "/decode", text.encode("utf-8"), connection)
+            self.assertEqual((status, body.decode("utf-8")), (200, decode_text(text)))
+
+    def test_statistics(self):
+        status, body = self.request("POST", "/statistics", TEXT.encode("utf-8"))
+        self.assertEqual(status, 200)
+        expected = compare_statistics(EntropyAccumulator(decode_text(TEXT)), EntropyAccumulator(TEXT))
+        self.assertEqual(json.loads(body), json.loads(json.dumps(expected)))
+
+    def test_invalid_utf8(self):
+        status, body = self.request("POST", "/decode", b"abc \xff\xfe def")
+        self.assertEqual(status, 400)
+        self.assertIn("UTF-8", json.loads(body)["error"])
+        # A sequence cut off by the end of the body is just as invalid, but
+        # with the output already streaming the response can only be cut short
+        with self.assertRaises((http.client.HTTPException, ConnectionError)):
+            self.request("POST", "/decode", "abc \u6771".encode("utf-8")[:-1])
+
+    def test_negative_sizes(self):
+        for head in (b"Content-Length: -5\r\n\r\nabc",
+                     b"Transfer-Encoding: chunked\r\n\r\n-5\r\nabc\r\n0\r\n\r\n"):
+            with socket.create_connection(("127.0.0.1", self.port), timeout=10) as sock:
+                sock.sendall(b"POST /decode HTTP/1.1\r\nHost: test\r\n" + head)
+                with sock.makefile('rb') as f:
+                    response = f.read()
+            self.assertTrue(response.startswith(b"HTTP/1.1 400 "), response)
+
+    def test_routing_errors(self):
+        self.assertEqual(self.request("GET", "/nowhere")[0], 404)
+        self.assertEqual(self.request("GET", "/decode")[0], 405)
+        self.assertEqual(self.request("POST", "/health", b"")[0], 405)
+
+    def test_health_and_metrics(self):
+        status, body = self.request("GET", "/health")
+        self.assertEqual((status, json.loads(body)), (200, {"status": "ok"}))
+        self.request("POST", "/decode", b"counted")
+        status, body = self.request("GET", "/metrics")
+        self.assertEqual(status, 200)
+        self.assertIsInstance(json.loads(body), dict)
+
+
+class SplitUtf8Test(unittest.TestCase):
+    def test_never_splits_a_sequence(self):
+        rng = random.Random(10)
+        data = TEXT.encode("utf-8")
+        for _ in range(500):
+            carry = b""
+            pieces = []
+            cuts = sorted(rng.sample(range(1, len(data)), rng.randint(1, 30)))
+            for start, end in zip([0] + cuts, cuts + [len(data)]):
+                complete, carry = split_utf8(carry + data[start:end])
+                pieces.append(complete.decode("utf-8"))
+            self.assertEqual(carry, b"")
+            self.assertEqual("".join(pieces), TEXT)
+
+
+if __name__ == '__main__':
+    unittest.main()
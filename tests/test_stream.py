@@ -0,0 +1,61 @@
+import random
+import unittest
+
+from ghostwriter_batch import journal_path_for, load_manifest, manifest_path_for, read_journal
+from ghostwriter_core import decode_text, encode_text, iter_decoded, iter_encoded
+from support import BatchTestCase, events_of, random_chunks, random_text, run_job
+
+
+class StreamTest(unittest.TestCase):
+    def test_iter_encoded_matches_whole_text(self):
+        rng = random.Random(3)
+        for _ in range(2000):
+            text = random_text(rng)
+            chunks = random_chunks(rng, text)
+            for single_char in (False, True):
+                self.assertEqual("".join(iter_encoded(chunks, single_char)), encode_text(text, single_char), chunks)
+
+    def test_word_longer_than_a_chunk(self):
+        chunks = ["ab\xe9\U0001f600"] * 1000 + [" end"]
+        for single_char in (False, True):
+            self.assertEqual("".join(iter_encoded(chunks, single_char)), encode_text("".join(chunks), single_char))
+        # Fully encoded, each piece comes out as soon as its chunk is read
+        read = []
+        encoded = iter_encoded(read.append(chunk) or chunk for chunk in chunks)
+        self.assertEqual(next(encoded), encode_text(chunks[0]))
+        self.assertEqual(len(read), 1)
+
+    def test_iter_decoded_matches_whole_text(self):
+        rng = random.Random(4)
+        for _ in range(2000):
+            text = random_text(rng)
+            chunks = random_chunks(rng, text)
+            self.assertEqual("".join(iter_decoded(chunks)), decode_text(text), chunks)
+
+    def test_round_trip(self):
+        rng = random.Random(5)
+        for _ in range(500):
+            text = " ".join(random_text(rng, list("ab\xe9\u6f22\U0001f600"), 8) for _ in range(rng.randint(0, 6)))
+            text = " ".join(text.split())
+            self.assertEqual(decode_text(encode_text(text)), text)
+            self.assertEqual(decode_text(encode_text(text, single_char=True)), text)
+
+
+class StreamingBatchTest(BatchTestCase):
+    def test_outputs_mirror_the_folder(self):
+        job, events = run_job(output_dir=self.output_dir, root=self.root)
+        self.assertTrue(job.completed)
+        self.assertEqual(events[-1][0], "finished")
+        self.assertEqual(events_of(events, "error"), [])
+        self.assertEqual(events_of(events, "found"), [(None, 8)])
+        self.assertEqual(len(events_of(events, "done")), 8)
+        for name, text in self.texts.items():
+            self.assertEqual(self.read_output(name), text)
+        # The journal of a finished job is gone, the manifest has every input
+        self.assertIsNone(read_journal(journal_path_for(self.output_dir)))
+        manifest = load_manifest(manifest_path_for(self.output_dir))
+        self.assertEqual(len(manifest["entries"]), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()